@@ -0,0 +1,179 @@
+"""In-process caches shared by the API handlers"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Returned by TTLCache.get when nothing is cached, so a cached None stays distinguishable
+MISSING = object()
+
+class TTLCache:
+    """LRU cache whose entries also expire after a time-to-live"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class TieredCache:
+    """TTLCache in front of an optional shared redis.asyncio tier; values must be JSON-serialisable"""
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, redis_client=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis_client
+        self.redis_hits = 0
+        self.redis_errors = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str, default: Any = MISSING) -> Any:
+        return (await self.get_many([key])).get(key, default)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Cached values of the keys that have one; local misses are read from Redis in one round trip"""
+        found = {}
+        remote = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if not remote or self.redis is None:
+            return found
+
+        try:
+            # The remaining TTL comes back with each value so a short-lived entry
+            # (e.g. a cached miss) is not kept locally for the namespace default
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in remote:
+                    pipe.get(self._redis_key(key)).pttl(self._redis_key(key))
+                replies = await pipe.execute()
+        except Exception as e:
+            print(f"Error reading {self.namespace} cache from Redis: {e}")
+            self.redis_errors += 1
+            return found
+        for key, raw, ttl_ms in zip(remote, replies[::2], replies[1::2]):
+            if raw is not None:
+                found[key] = json.loads(raw)
+                self.redis_hits += 1
+                # pttl is -1 for a key without expiry
+                self.local.set(key, found[key], min(self.ttl, ttl_ms / 1000) if ttl_ms > 0 else self.ttl)
+        return found
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, values: Dict[str, Any], ttl: Optional[float] = None):
+        """Store every key with the same TTL, written to Redis in one round trip"""
+        ttl = self.ttl if ttl is None else ttl
+        for key, value in values.items():
+            self.local.set(key, value, ttl)
+        if self.redis is None or not values:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(self._redis_key(key), json.dumps(value), ex=max(1, int(ttl)))
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error writing {self.namespace} cache to Redis: {e}")
+            self.redis_errors += 1
+
+    async def invalidate(self, key: str):
+        self.local.invalidate(key)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(key))
+            except Exception as e:
+                print(f"Error deleting {self.namespace} cache key from Redis: {e}")
+                self.redis_errors += 1
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hits = stats["hits"] + self.redis_hits
+        stats.update({
+            "redis_enabled": self.redis is not None,
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        })
+        return stats
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight coroutine"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller being cancelled does not cancel the shared call for the rest
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        requested = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "upstream_calls": self.calls,
+            "coalesced_calls": self.coalesced,
+            "coalesced_rate": round(self.coalesced / requested, 4) if requested else 0.0
+        }
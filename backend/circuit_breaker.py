@@ -0,0 +1,130 @@
+"""Circuit breaker with rolling error and latency windows for slow upstream dependencies"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Call rejected without trying because the circuit is open"""
+
+class LatencyBudgetExceeded(Exception):
+    """Call did not finish within its latency budget"""
+
+class CircuitBreaker:
+    """Opens after too many failed or slow calls in the last window_size calls.
+
+    A failure is an exception is_failure accepts (by default any) or running past
+    the latency budget; a slow call is a success that took longer than
+    slow_call_seconds. While open, calls fail fast with CircuitOpenError. After
+    open_seconds a single trial call is let through (half open): success closes
+    the circuit, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 2.0,
+        slow_call_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        latency_budget: Optional[float] = None,
+        is_failure: Callable[[Exception], bool] = lambda error: True
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.latency_budget = latency_budget
+        self.is_failure = is_failure
+        # (failed, slow, latency_seconds) for the most recent calls
+        self._window: "deque[tuple]" = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def _rates(self) -> tuple:
+        if not self._window:
+            return 0.0, 0.0
+        failures = sum(1 for failed, _, _ in self._window if failed)
+        slow = sum(1 for _, slow, _ in self._window if slow)
+        return failures / len(self._window), slow / len(self._window)
+
+    def _record(self, failed: bool, latency: float, trial: bool):
+        self._window.append((failed, not failed and latency > self.slow_call_seconds, latency))
+        if trial:
+            self._trial_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self._state = CLOSED
+                self._window.clear()
+            return
+
+        if self._state == CLOSED and len(self._window) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._open()
+
+    async def call(self, call: Callable[[], Awaitable[Any]], latency_budget: Optional[float] = None) -> Any:
+        state = self.state
+        trial = False
+        if state == OPEN or (state == HALF_OPEN and self._trial_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if state == HALF_OPEN:
+            trial = True
+            self._trial_in_flight = True
+
+        budget = self.latency_budget if latency_budget is None else latency_budget
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(), timeout=budget)
+        except asyncio.TimeoutError:
+            self._record(True, time.monotonic() - start, trial)
+            raise LatencyBudgetExceeded(f"{self.name} exceeded its {budget}s latency budget")
+        except asyncio.CancelledError:
+            if trial:
+                self._trial_in_flight = False
+            raise
+        except Exception as e:
+            # Errors the dependency reports about the request itself say nothing about its health
+            self._record(self.is_failure(e), time.monotonic() - start, trial)
+            raise
+        self._record(False, time.monotonic() - start, trial)
+        return result
+
+    def stats(self) -> dict:
+        failure_rate, slow_rate = self._rates()
+        latencies = sorted(latency for _, _, latency in self._window)
+        return {
+            "state": self.state,
+            "window_calls": len(latencies),
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4),
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            "latency_budget_seconds": self.latency_budget,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened
+        }
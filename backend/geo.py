@@ -0,0 +1,52 @@
+"""Great-circle distance and bearing, scalar and vectorized over NumPy coordinate arrays"""
+import math
+from typing import Iterable, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(coord1: dict, coord2: dict) -> float:
+    lat1, lng1 = math.radians(coord1["lat"]), math.radians(coord1["lng"])
+    lat2, lng2 = math.radians(coord2["lat"]), math.radians(coord2["lng"])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
+
+def bearing_degrees(coord1: dict, coord2: dict) -> float:
+    """Initial compass bearing from coord1 towards coord2, 0-360"""
+    lat1, lat2 = math.radians(coord1["lat"]), math.radians(coord2["lat"])
+    d_lng = math.radians(coord2["lng"] - coord1["lng"])
+    y = math.sin(d_lng) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(d_lng)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+def coordinate_arrays(coordinates: Iterable[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Columnar float64 (lat, lng) arrays from {"lat", "lng"} dicts"""
+    points = np.array([(c["lat"], c["lng"]) for c in coordinates], dtype=np.float64).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+def haversine_pairwise_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Distance between corresponding points of equal-length (or broadcastable) arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    # Rounding can push a a hair above 1 for antipodal points
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """N x M distances from N origins to M destinations"""
+    lat1, lng1 = np.asarray(lat1, dtype=np.float64)[:, None], np.asarray(lng1, dtype=np.float64)[:, None]
+    lat2, lng2 = np.asarray(lat2, dtype=np.float64)[None, :], np.asarray(lng2, dtype=np.float64)[None, :]
+    return haversine_pairwise_km(lat1, lng1, lat2, lng2)
+
+def bearing_pairwise_degrees(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    d_lng = lng2 - lng1
+    y = np.sin(d_lng) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(d_lng)
+    return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+def bearing_matrix_degrees(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """N x M initial bearings from N origins to M destinations"""
+    lat1, lng1 = np.asarray(lat1, dtype=np.float64)[:, None], np.asarray(lng1, dtype=np.float64)[:, None]
+    lat2, lng2 = np.asarray(lat2, dtype=np.float64)[None, :], np.asarray(lng2, dtype=np.float64)[None, :]
+    return bearing_pairwise_degrees(lat1, lng1, lat2, lng2)
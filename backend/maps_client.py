@@ -0,0 +1,220 @@
+"""Non-blocking Google Maps web service client built on httpx"""
+import asyncio
+import random
+import time
+from typing import List, Optional, Union
+
+import httpx
+
+from cache import SingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyBudgetExceeded
+
+GOOGLE_MAPS_BASE_URL = "https://maps.googleapis.com"
+
+# Seconds one attempt may take, queueing for a concurrency slot included, before
+# the caller gets LATENCY_BUDGET_EXCEEDED; only the upstream part counts against the
+# circuit breaker, and backing off between retries is not included
+DEFAULT_LATENCY_BUDGETS = {"directions": 3.0, "distance_matrix": 3.0, "geocode": 2.0}
+
+# Statuses worth another attempt; anything else non-OK is a caller error
+RETRIABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR", "HTTP_ERROR", "TRANSPORT_ERROR"}
+
+class MapsError(Exception):
+    """Maps API returned an error status or could not be reached"""
+
+    def __init__(self, status: str, message: str = ""):
+        super().__init__(f"{status}: {message}" if message else status)
+        self.status = status
+
+def single_flight_key(path: str, params: dict) -> tuple:
+    """Request identity with whitespace and case differences in parameter values removed"""
+    return (path, tuple(sorted((name, " ".join(str(value).split()).casefold()) for name, value in params.items())))
+
+def format_waypoints(locations: Union[str, List[str]]) -> str:
+    if isinstance(locations, str):
+        return locations
+    return "|".join(locations)
+
+class RateLimiter:
+    """Token bucket: acquire(n) waits until n tokens have accrued at rate per second"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class AsyncMapsClient:
+    """Directions, distance matrix and geocoding over one pooled keep-alive connection set.
+
+    Results have the same shape as the googlemaps.Client methods they replace:
+    directions and geocode return the result list, distance_matrix the full body.
+    Each operation has its own circuit breaker; a rejected or over-budget call
+    raises MapsError with status CIRCUIT_OPEN or LATENCY_BUDGET_EXCEEDED.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = GOOGLE_MAPS_BASE_URL,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        latency_budgets: Optional[dict] = None,
+        breaker_options: Optional[dict] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+        self.single_flight = SingleFlight()
+        budgets = {**DEFAULT_LATENCY_BUDGETS, **(latency_budgets or {})}
+        self.breakers = {
+            operation: CircuitBreaker(
+                operation,
+                latency_budget=budget,
+                is_failure=lambda error: not isinstance(error, MapsError) or error.status in RETRIABLE_STATUSES,
+                **(breaker_options or {})
+            )
+            for operation, budget in budgets.items()
+        }
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _send(self, path: str, params: dict) -> dict:
+        try:
+            self.requests += 1
+            response = await self._http.get(path, params=params)
+        except httpx.TransportError as e:
+            raise MapsError("TRANSPORT_ERROR", str(e)) from e
+        
+        if response.status_code >= 500:
+            raise MapsError("HTTP_ERROR", f"status code {response.status_code}")
+        if response.status_code >= 400:
+            raise MapsError("REQUEST_DENIED", f"status code {response.status_code}")
+        
+        body = response.json()
+        status = body.get("status", "OK")
+        if status not in ("OK", "ZERO_RESULTS"):
+            raise MapsError(status, body.get("error_message", ""))
+        return body
+
+    async def _request(self, operation: str, path: str, params: dict) -> dict:
+        # Identical concurrent lookups (e.g. a shift change on one airport corridor) share a single call
+        return await self.single_flight.run(
+            single_flight_key(path, params),
+            lambda: self._request_with_retries(operation, path, params)
+        )
+
+    async def _guarded_send(self, operation: str, path: str, params: dict) -> dict:
+        breaker = self.breakers[operation]
+        budget = breaker.latency_budget
+        queued = self._semaphore.locked()
+        start = time.monotonic()
+        # The budget covers waiting for a concurrency slot too, so callers fall back
+        # in time however deep the queue; the breaker only times the upstream send,
+        # so a burst queued behind the cap is not mistaken for a slow upstream
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=budget)
+        except asyncio.TimeoutError:
+            raise MapsError("LATENCY_BUDGET_EXCEEDED", f"{operation} waited {budget}s for a concurrency slot")
+        try:
+            call = breaker.call(lambda: self._send(path, params))
+            if queued:
+                call = asyncio.wait_for(call, timeout=budget - (time.monotonic() - start))
+            return await call
+        except asyncio.TimeoutError:
+            raise MapsError("LATENCY_BUDGET_EXCEEDED", f"{operation} ran out of its {budget}s budget after queueing")
+        except CircuitOpenError as e:
+            raise MapsError("CIRCUIT_OPEN", str(e)) from e
+        except LatencyBudgetExceeded as e:
+            raise MapsError("LATENCY_BUDGET_EXCEEDED", str(e)) from e
+        finally:
+            self._semaphore.release()
+
+    async def _request_with_retries(self, operation: str, path: str, params: dict) -> dict:
+        params = {**params, "key": self.api_key}
+        attempt = 0
+        while True:
+            try:
+                return await self._guarded_send(operation, path, params)
+            except MapsError as e:
+                if e.status not in RETRIABLE_STATUSES or attempt >= self.max_retries:
+                    if e.status != "CIRCUIT_OPEN":
+                        self.failures += 1
+                    raise
+            
+            # Full jitter keeps a burst of failed callers from retrying in lockstep
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+
+    async def directions(
+        self,
+        origin: str,
+        destination: str,
+        mode: str = "driving",
+        waypoints: Optional[Union[str, List[str]]] = None,
+        departure_time: Optional[str] = None
+    ) -> list:
+        params = {"origin": origin, "destination": destination, "mode": mode}
+        if waypoints:
+            params["waypoints"] = format_waypoints(waypoints)
+        if departure_time:
+            params["departure_time"] = departure_time
+        body = await self._request("directions", "/maps/api/directions/json", params)
+        return body.get("routes", [])
+
+    async def distance_matrix(
+        self,
+        origins: Union[str, List[str]],
+        destinations: Union[str, List[str]],
+        mode: str = "driving",
+        units: str = "metric"
+    ) -> dict:
+        params = {
+            "origins": format_waypoints(origins),
+            "destinations": format_waypoints(destinations),
+            "mode": mode,
+            "units": units
+        }
+        return await self._request("distance_matrix", "/maps/api/distancematrix/json", params)
+
+    async def geocode(self, address: str) -> list:
+        body = await self._request("geocode", "/maps/api/geocode/json", {"address": address})
+        return body.get("results", [])
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "single_flight": self.single_flight.stats(),
+            "circuits": {operation: breaker.stats() for operation, breaker in self.breakers.items()}
+        }
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the Google Maps web services used by AsyncMapsClient.
+
+Answers directions, distance matrix and geocode requests from straight-line
+distances with a configurable artificial latency, so the maps code paths can be
+load tested and benchmarked without network access or an API key.
+
+Usage: python maps_standin.py [--port 8090] [--latency-ms 150]
+Then start the backend with GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8090 and any
+GOOGLE_MAPS_API_KEY value.
+"""
+import argparse
+import asyncio
+import math
+from typing import Optional
+
+from fastapi import FastAPI
+
+import polyline
+
+ROAD_FACTOR = 1.3  # road distance per straight-line km
+SPEED_KMH = 40.0
+
+def parse_point(value: str) -> Optional[tuple]:
+    try:
+        lat, lng = value.split(",")
+        return float(lat), float(lng)
+    except ValueError:
+        return None
+
+def haversine_km(a: tuple, b: tuple) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(h))
+
+def format_point(point: tuple) -> str:
+    return f"{point[0]},{point[1]}"
+
+def leg(a: tuple, b: tuple, mode: str) -> dict:
+    distance_km = haversine_km(a, b) * ROAD_FACTOR
+    speed_kmh = 5.0 if mode == "walking" else SPEED_KMH
+    return {
+        "distance": {"value": round(distance_km * 1000), "text": f"{distance_km:.1f} km"},
+        "duration": {"value": round(distance_km / speed_kmh * 3600), "text": f"{round(distance_km / speed_kmh * 60)} mins"}
+    }
+
+def route_leg(a: tuple, b: tuple, mode: str) -> dict:
+    straight = leg(a, b, mode)
+    return dict(
+        straight,
+        start_address=format_point(a),
+        end_address=format_point(b),
+        steps=[dict(straight, html_instructions=f"Head to {format_point(b)}")]
+    )
+
+def create_app(latency_ms: float = 150.0) -> FastAPI:
+    app = FastAPI(title="Maps stand-in")
+    app.state.latency_ms = latency_ms
+    app.state.requests = 0
+
+    async def simulate_latency():
+        app.state.requests += 1
+        if app.state.latency_ms:
+            await asyncio.sleep(app.state.latency_ms / 1000)
+
+    @app.get("/maps/api/directions/json")
+    async def directions(origin: str, destination: str, mode: str = "driving", waypoints: Optional[str] = None):
+        await simulate_latency()
+        stops = [parse_point(origin)]
+        if waypoints:
+            stops.extend(parse_point(waypoint) for waypoint in waypoints.split("|"))
+        stops.append(parse_point(destination))
+        if None in stops:
+            return {"status": "NOT_FOUND", "routes": []}
+        return {
+            "status": "OK",
+            "routes": [{
+                "summary": "Stand-in route",
+                "legs": [route_leg(a, b, mode) for a, b in zip(stops, stops[1:])],
+                "overview_polyline": {"points": polyline.encode(stops)}
+            }]
+        }
+
+    @app.get("/maps/api/distancematrix/json")
+    async def distance_matrix(origins: str, destinations: str, mode: str = "driving"):
+        await simulate_latency()
+        origin_points = [parse_point(origin) for origin in origins.split("|")]
+        destination_points = [parse_point(destination) for destination in destinations.split("|")]
+        return {
+            "status": "OK",
+            "origin_addresses": origins.split("|"),
+            "destination_addresses": destinations.split("|"),
+            "rows": [
+                {"elements": [
+                    dict(leg(a, b, mode), status="OK") if a and b else {"status": "NOT_FOUND"}
+                    for b in destination_points
+                ]}
+                for a in origin_points
+            ]
+        }
+
+    @app.get("/maps/api/geocode/json")
+    async def geocode(address: str):
+        await simulate_latency()
+        point = parse_point(address) or (41.0082, 28.9784)  # Istanbul city centre
+        return {
+            "status": "OK",
+            "results": [{
+                "formatted_address": address,
+                "geometry": {"location": {"lat": point[0], "lng": point[1]}},
+                "place_id": f"standin-{abs(hash(address))}"
+            }]
+        }
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Google Maps stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host=args.host, port=args.port)
@@ -0,0 +1,92 @@
+"""Encoded polyline decoding and encoding, and Douglas-Peucker simplification"""
+import math
+from typing import List, Tuple
+
+Point = Tuple[float, float]  # (lat, lng)
+
+PRECISION = 5  # Google overview polylines carry 1e-5 degree coordinates
+EARTH_RADIUS_M = 6371000.0
+# Ground metres covered by one 256px web-mercator tile pixel at zoom 0 on the equator
+METERS_PER_PIXEL_ZOOM_0 = 156543.03392
+
+def decode(encoded: str, precision: int = PRECISION) -> List[Point]:
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+def encode(points: List[Point], precision: int = PRECISION) -> str:
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lng = 0
+    for point in points:
+        lat, lng = round(point[0] * factor), round(point[1] * factor)
+        for delta in (lat - previous_lat, lng - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        previous_lat, previous_lng = lat, lng
+    return "".join(encoded)
+
+def zoom_tolerance_m(zoom: float, latitude: float, pixels: float = 1.0) -> float:
+    """Ground distance one screen pixel covers at a map zoom level"""
+    return METERS_PER_PIXEL_ZOOM_0 * math.cos(math.radians(latitude)) / (2 ** zoom) * pixels
+
+def _segment_distance_m(point: tuple, start: tuple, end: tuple) -> float:
+    # Points are already projected to local planar metres
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+    t = max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(point[0] - (start[0] + t * dx), point[1] - (start[1] + t * dy))
+
+def simplify(points: List[Point], tolerance_m: float) -> List[Point]:
+    """Douglas-Peucker: drop points closer than tolerance_m to the simplified line"""
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+
+    # Equirectangular projection is accurate to well under a pixel at city scale
+    cos_lat = math.cos(math.radians(points[0][0]))
+    projected = [
+        (math.radians(lng) * EARTH_RADIUS_M * cos_lat, math.radians(lat) * EARTH_RADIUS_M)
+        for lat, lng in points
+    ]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_distance = None, tolerance_m
+        for index in range(first + 1, last):
+            distance = _segment_distance_m(projected[index], projected[first], projected[last])
+            if distance > max_distance:
+                farthest, max_distance = index, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+def simplify_for_zoom(points: List[Point], zoom: float, pixels: float = 1.0) -> List[Point]:
+    if not points:
+        return []
+    return simplify(points, zoom_tolerance_m(zoom, points[0][0], pixels))
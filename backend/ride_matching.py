@@ -0,0 +1,162 @@
+"""Grouping open taxi-share requests into shared rides of mutually compatible riders"""
+import functools
+import itertools
+import math
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+import geo
+
+# Two requests are compatible when both pickups and both drop-offs are within
+# MATCH_RADIUS_KM and the pickup times within both riders' waiting times
+MATCH_RADIUS_KM = 7.0
+MATCH_WINDOW_MINUTES = 30
+MAX_RIDERS = 3
+NEIGHBOURS = 8  # closest compatible requests kept per request
+EXACT_LIMIT = 12  # linked requests up to this many are grouped exhaustively
+
+# Candidates come from neighbouring origin cells and pickup buckets only. Cells are
+# at least MATCH_RADIUS_KM wide up to MATCH_MAX_LATITUDE, so a 3x3 neighbourhood
+# covers the whole radius
+MATCH_MAX_LATITUDE = 42.5
+MATCH_CELL_LAT_DEGREES = MATCH_RADIUS_KM / 111.32
+MATCH_CELL_LNG_DEGREES = MATCH_RADIUS_KM / (111.32 * math.cos(math.radians(MATCH_MAX_LATITUDE)))
+
+def match_cell_index(coordinates: dict) -> tuple:
+    return (
+        math.floor(coordinates["lat"] / MATCH_CELL_LAT_DEGREES),
+        math.floor(coordinates["lng"] / MATCH_CELL_LNG_DEGREES)
+    )
+
+def pickup_bucket(pickup_time: datetime) -> int:
+    """Pickup time in MATCH_WINDOW_MINUTES buckets since the epoch"""
+    if pickup_time.tzinfo is not None:
+        pickup_time = pickup_time.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((pickup_time - datetime(1970, 1, 1)).total_seconds() // (MATCH_WINDOW_MINUTES * 60))
+
+def shortest_path_km(stops: tuple, distances: dict) -> float:
+    """Shortest route visiting every stop, any start and end"""
+    legs = [distances[frozenset(pair)] for pair in itertools.combinations(stops, 2)]
+    # Up to three stops the shortest open path is every leg but the longest
+    return sum(legs) - max(legs) if len(legs) > 1 else legs[0]
+
+def match_edges(bookings: List[dict], neighbours: int = NEIGHBOURS) -> Dict[frozenset, tuple]:
+    """(origin km, destination km) for every compatible pair of requests, by frozenset of indices"""
+    origin_lat, origin_lng = geo.coordinate_arrays(booking["origin"]["coordinates"] for booking in bookings)
+    dest_lat, dest_lng = geo.coordinate_arrays(booking["destination"]["coordinates"] for booking in bookings)
+    pickup_seconds = np.array([(booking["pickup_time"] - datetime(1970, 1, 1)).total_seconds() for booking in bookings])
+    max_wait_seconds = np.array([min(booking.get("max_waiting_time", 7), MATCH_WINDOW_MINUTES) * 60
+                                 for booking in bookings], dtype=np.float64)
+    user_ids = {}
+    users = np.array([user_ids.setdefault(booking["user_id"], len(user_ids)) for booking in bookings])
+
+    # Only neighbouring origin cells and pickup buckets can be in range;
+    # destinations are screened in the arrays
+    cells = [(match_cell_index(booking["origin"]["coordinates"]), pickup_bucket(booking["pickup_time"]))
+             for booking in bookings]
+    keys = {}
+    for index, key in enumerate(cells):
+        keys.setdefault(key, []).append(index)
+    keys = {key: np.array(indices) for key, indices in keys.items()}
+
+    edges = {}
+    for index, ((row, column), bucket) in enumerate(cells):
+        candidates = np.concatenate([
+            keys[key]
+            for key in (((row + d_row, column + d_column), bucket + d_bucket)
+                        for d_row in (-1, 0, 1) for d_column in (-1, 0, 1) for d_bucket in (-1, 0, 1))
+            if key in keys
+        ])
+        candidates = candidates[candidates > index]
+        if not len(candidates):
+            continue
+
+        origin_km = geo.haversine_pairwise_km(origin_lat[index], origin_lng[index], origin_lat[candidates], origin_lng[candidates])
+        dest_km = geo.haversine_pairwise_km(dest_lat[index], dest_lng[index], dest_lat[candidates], dest_lng[candidates])
+        compatible = (
+            (origin_km <= MATCH_RADIUS_KM) & (dest_km <= MATCH_RADIUS_KM)
+            & (users[candidates] != users[index])
+            & (np.abs(pickup_seconds[candidates] - pickup_seconds[index])
+               <= np.minimum(max_wait_seconds[candidates], max_wait_seconds[index]))
+        )
+        for other, origin_distance, dest_distance in zip(candidates[compatible].tolist(),
+                                                         origin_km[compatible].tolist(), dest_km[compatible].tolist()):
+            edges[frozenset((index, other))] = (origin_distance, dest_distance)
+
+    # Keep each request's closest partners so dense areas stay tractable
+    partners = {}
+    for edge, (origin_distance, dest_distance) in edges.items():
+        for index in edge:
+            partners.setdefault(index, []).append((origin_distance + dest_distance, edge))
+    kept = set()
+    for ranked in partners.values():
+        kept.update(edge for _, edge in sorted(ranked, key=lambda item: item[0])[:neighbours])
+    return {edge: edges[edge] for edge in kept}
+
+def group_bookings(bookings: List[dict], max_riders: int = MAX_RIDERS, neighbours: int = NEIGHBOURS,
+                   exact_limit: int = EXACT_LIMIT) -> List[List[dict]]:
+    """Shared rides of 2 to max_riders mutually compatible requests, matching as many riders
+    as possible and, among equally many, with the least pickup and drop-off detour"""
+    edges = match_edges(bookings, neighbours) if len(bookings) > 1 else {}
+    origin_km = {edge: distances[0] for edge, distances in edges.items()}
+    dest_km = {edge: distances[1] for edge, distances in edges.items()}
+    linked_to = {}
+    for edge in edges:
+        first, second = tuple(edge)
+        linked_to.setdefault(first, set()).add(second)
+        linked_to.setdefault(second, set()).add(first)
+
+    # Candidate rides: every compatible pair, and every triple compatible pairwise
+    rides = {edge: origin_km[edge] + dest_km[edge] for edge in edges}
+    if max_riders >= 3:
+        for index, linked in linked_to.items():
+            for first, second in itertools.combinations(sorted(other for other in linked if other > index), 2):
+                if second in linked_to[first]:
+                    stops = (index, first, second)
+                    rides[frozenset(stops)] = shortest_path_km(stops, origin_km) + shortest_path_km(stops, dest_km)
+    rides_by_rider = {}
+    for ride in rides:
+        for index in ride:
+            rides_by_rider.setdefault(index, []).append(ride)
+
+    chosen = []
+    seen = set()
+    for start in linked_to:
+        if start in seen:
+            continue
+        # Requests linked by compatibility, solved independently of the rest
+        component, stack = [], [start]
+        seen.add(start)
+        while stack:
+            index = stack.pop()
+            component.append(index)
+            for other in linked_to[index] - seen:
+                seen.add(other)
+                stack.append(other)
+
+        if len(component) <= exact_limit:
+            @functools.lru_cache(maxsize=None)
+            def best(remaining: frozenset) -> tuple:
+                """(riders matched, -detour km, rides) for the requests still unassigned"""
+                if not remaining:
+                    return (0, 0.0, ())
+                index = min(remaining)
+                options = [best(remaining - {index})]
+                for ride in rides_by_rider.get(index, ()):
+                    if ride <= remaining:
+                        matched, detour, chosen_rides = best(remaining - ride)
+                        options.append((matched + len(ride), detour - rides[ride], chosen_rides + (ride,)))
+                return max(options, key=lambda option: option[:2])
+            chosen.extend(best(frozenset(component))[2])
+        else:
+            # Too large to search exhaustively: fullest, then shortest, rides first
+            assigned = set()
+            for ride in sorted({ride for index in component for ride in rides_by_rider[index]},
+                               key=lambda ride: (-len(ride), rides[ride])):
+                if not ride & assigned:
+                    assigned |= ride
+                    chosen.append(ride)
+
+    return [sorted((bookings[index] for index in ride), key=lambda booking: booking["pickup_time"]) for ride in chosen]
@@ -0,0 +1,201 @@
+"""Routing providers: Google Maps, or a local haversine and speed-profile estimate"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from geo import coordinate_arrays, haversine_km, haversine_matrix_km
+
+# Istanbul has stayed on UTC+3 all year since 2016; stored times are naive UTC
+ISTANBUL_UTC_OFFSET = timedelta(hours=3)
+
+# Average door-to-door driving speed in km/h for each local hour. Peaks follow the
+# bridge and motorway congestion pattern; nights are close to free flow.
+ISTANBUL_SPEED_PROFILE = {
+    "weekday": [
+        52, 55, 57, 57, 55, 48, 36, 24, 20, 24, 30, 32,
+        32, 31, 30, 28, 24, 20, 19, 22, 30, 38, 44, 48
+    ],
+    "weekend": [
+        50, 52, 55, 56, 56, 54, 50, 45, 40, 36, 33, 31,
+        30, 30, 30, 30, 29, 28, 28, 30, 34, 40, 44, 47
+    ]
+}
+HOURS_PER_WEEK = 168
+WALKING_SPEED_KMH = 4.8
+DEFAULT_ROAD_FACTOR = 1.35  # road km per straight-line km across the city
+
+def format_coordinates(coordinates: dict) -> str:
+    return f"{coordinates['lat']},{coordinates['lng']}"
+
+class RoutingProvider(ABC):
+    """Driving and walking routes between {"lat", "lng"} coordinates.
+
+    route() returns {"distance_km", "duration_minutes", "route_polyline", "estimated"}
+    or None when no route exists; distance_matrix() returns one row per origin of
+    {"distance_km", "duration_minutes", "estimated"} elements, None where unroutable.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def route(
+        self,
+        origin: dict,
+        destination: dict,
+        waypoints: Optional[List[dict]] = None,
+        mode: str = "driving",
+        departure_time: Optional[datetime] = None
+    ) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def distance_matrix(
+        self,
+        origins: List[dict],
+        destinations: List[dict],
+        mode: str = "driving",
+        departure_time: Optional[datetime] = None
+    ) -> List[List[Optional[dict]]]:
+        ...
+
+class GoogleRoutingProvider(RoutingProvider):
+    """Routes from the Google Maps web services through an AsyncMapsClient"""
+
+    name = "google"
+
+    def __init__(self, maps_client):
+        self.maps_client = maps_client
+
+    async def route(self, origin, destination, waypoints=None, mode="driving", departure_time=None):
+        # departure_time is not forwarded: Google rejects past times and only uses it for traffic
+        directions = await self.maps_client.directions(
+            origin=format_coordinates(origin),
+            destination=format_coordinates(destination),
+            waypoints=[format_coordinates(waypoint) for waypoint in waypoints] if waypoints else None,
+            mode=mode
+        )
+        if not directions:
+            return None
+
+        legs = directions[0]["legs"]
+        return {
+            "distance_km": sum(leg["distance"]["value"] for leg in legs) / 1000,
+            "duration_minutes": sum(leg["duration"]["value"] for leg in legs) / 60,
+            "route_polyline": directions[0]["overview_polyline"]["points"],
+            "estimated": False
+        }
+
+    async def distance_matrix(self, origins, destinations, mode="driving", departure_time=None):
+        result = await self.maps_client.distance_matrix(
+            origins=[format_coordinates(origin) for origin in origins],
+            destinations=[format_coordinates(destination) for destination in destinations],
+            mode=mode,
+            units="metric"
+        )
+        return [
+            [
+                {
+                    "distance_km": element["distance"]["value"] / 1000,
+                    "duration_minutes": element["duration"]["value"] / 60,
+                    "estimated": False
+                } if element["status"] == "OK" else None
+                for element in row["elements"]
+            ]
+            for row in result["rows"]
+        ]
+
+class LocalRoutingProvider(RoutingProvider):
+    """Estimates from straight-line distance, a road factor and hourly speeds; no network calls"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        road_factor: float = DEFAULT_ROAD_FACTOR,
+        speed_profile: Optional[dict] = None,
+        walking_speed_kmh: float = WALKING_SPEED_KMH,
+        utc_offset: timedelta = ISTANBUL_UTC_OFFSET
+    ):
+        self.road_factor = road_factor
+        self.speed_profile = speed_profile or ISTANBUL_SPEED_PROFILE
+        self.walking_speed_kmh = walking_speed_kmh
+        self.utc_offset = utc_offset
+
+    def hour_of_week(self, departure_time: Optional[datetime] = None) -> int:
+        """Local hour counted from Monday 00:00, 0-167"""
+        local_time = (departure_time or datetime.utcnow()) + self.utc_offset
+        return local_time.weekday() * 24 + local_time.hour
+
+    def hour_of_week_speeds(self) -> List[float]:
+        """Driving speed for every hour of the week, indexed by hour_of_week()"""
+        return [
+            self.speed_profile["weekend" if hour // 24 >= 5 else "weekday"][hour % 24]
+            for hour in range(HOURS_PER_WEEK)
+        ]
+
+    def speed_kmh(self, mode: str, departure_time: Optional[datetime] = None) -> float:
+        if mode == "walking":
+            return self.walking_speed_kmh
+
+        hour = self.hour_of_week(departure_time)
+        return self.speed_profile["weekend" if hour // 24 >= 5 else "weekday"][hour % 24]
+
+    def mode_road_factor(self, mode: str) -> float:
+        # Walkers take shorter cuts than the road network allows
+        return 1.0 + (self.road_factor - 1.0) / 2 if mode == "walking" else self.road_factor
+
+    def estimate(self, origin: dict, destination: dict, mode: str = "driving",
+                 departure_time: Optional[datetime] = None) -> dict:
+        distance_km = haversine_km(origin, destination) * self.mode_road_factor(mode)
+        return {
+            "distance_km": distance_km,
+            "duration_minutes": distance_km / self.speed_kmh(mode, departure_time) * 60,
+            "estimated": True
+        }
+
+    async def route(self, origin, destination, waypoints=None, mode="driving", departure_time=None):
+        stops = [origin, *(waypoints or []), destination]
+        legs = [self.estimate(a, b, mode, departure_time) for a, b in zip(stops, stops[1:])]
+        return {
+            "distance_km": sum(leg["distance_km"] for leg in legs),
+            "duration_minutes": sum(leg["duration_minutes"] for leg in legs),
+            "route_polyline": "",
+            "estimated": True
+        }
+
+    async def distance_matrix(self, origins, destinations, mode="driving", departure_time=None):
+        distances = haversine_matrix_km(*coordinate_arrays(origins), *coordinate_arrays(destinations))
+        distances *= self.mode_road_factor(mode)
+        durations = distances / self.speed_kmh(mode, departure_time) * 60
+        return [
+            [
+                {"distance_km": distance_km, "duration_minutes": duration_minutes, "estimated": True}
+                for distance_km, duration_minutes in zip(distance_row, duration_row)
+            ]
+            for distance_row, duration_row in zip(distances.tolist(), durations.tolist())
+        ]
+
+class FallbackRoutingProvider(RoutingProvider):
+    """Primary provider, answered by the fallback while the primary fails, is over budget or open-circuited"""
+
+    def __init__(self, primary: RoutingProvider, fallback: RoutingProvider):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+        self.fallbacks = 0
+
+    async def route(self, origin, destination, waypoints=None, mode="driving", departure_time=None):
+        try:
+            return await self.primary.route(origin, destination, waypoints, mode, departure_time)
+        except Exception as e:
+            print(f"Routing via {self.primary.name} failed, using {self.fallback.name} estimate: {e}")
+            self.fallbacks += 1
+            return await self.fallback.route(origin, destination, waypoints, mode, departure_time)
+
+    async def distance_matrix(self, origins, destinations, mode="driving", departure_time=None):
+        try:
+            return await self.primary.distance_matrix(origins, destinations, mode, departure_time)
+        except Exception as e:
+            print(f"Distance matrix via {self.primary.name} failed, using {self.fallback.name} estimate: {e}")
+            self.fallbacks += 1
+            return await self.fallback.distance_matrix(origins, destinations, mode, departure_time)
@@ -1,20 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, HTTPException, Depends, Query, status, WebSocket, WebSocketDisconnect, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Union
 from datetime import datetime, timedelta
+from collections import deque
 import os
 import uuid
 import hashlib
+import time
 import jwt
-import googlemaps
 import json
 import asyncio
+import base64
+import re
+import sys
+import unicodedata
 from twilio.rest import Client as TwilioClient
 from dotenv import load_dotenv
-import redis
+import redis.asyncio as redis
+from cache import MISSING, TieredCache, TTLCache
+from maps_client import GOOGLE_MAPS_BASE_URL, AsyncMapsClient, MapsError, RateLimiter
+import geo
+import polyline
+import ride_matching
+from routing import HOURS_PER_WEEK, FallbackRoutingProvider, GoogleRoutingProvider, LocalRoutingProvider
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
 # Load environment variables from .env file
@@ -34,13 +48,28 @@ app.add_middleware(
 
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/').strip('"')
-client = MongoClient(MONGO_URL)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+# One shared async client per worker; every handler goes through its pool
+# instead of blocking the event loop on synchronous pymongo calls.
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=5000,
+    retryWrites=True
+)
 db = client.carpooling_db
 
 # Collections
 users_collection = db.users
-trips_collection = db.trips
-personal_car_trips_collection = db.personal_car_trips
+trips_collection = db.trips  # taxi and personal car trips, discriminated by trip_type
+legacy_personal_car_trips_collection = db.personal_car_trips  # only read by migrate_trip_store
 bookings_collection = db.bookings
 join_requests_collection = db.join_requests
 messages_collection = db.messages
@@ -48,6 +77,259 @@ live_tracking_collection = db.live_tracking
 bus_stops_collection = db.bus_stops
 payment_transactions_collection = db.payment_transactions
 wallet_collection = db.wallet
+taxi_bookings_collection = db.taxi_bookings
+
+# Index declarations, built idempotently on startup. Every hot-path filter
+# below must be served by one of these (see check_index_coverage).
+COLLECTION_INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("employee_id", ASCENDING)], unique=True),
+    ],
+    "trips": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("departure_time", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("trip_type", ASCENDING), ("status", ASCENDING), ("departure_time", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("creator_id", ASCENDING)]),
+        IndexModel([("departure_time", ASCENDING)]),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("trip_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "join_requests": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("trip_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("requester_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "messages": [
+        IndexModel([("trip_id", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "live_tracking": [
+        IndexModel([("trip_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+    ],
+    "bus_stops": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("geo", GEOSPHERE)]),
+    ],
+    "taxi_bookings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("pickup_time", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "payment_transactions": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("payment_session_id", ASCENDING)]),
+    ],
+    "wallet": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+}
+
+# Representative (collection, filter, sort) shapes of the queries issued by
+# the API routes. check_index_coverage explains each one.
+INDEX_COVERAGE_QUERIES = [
+    ("users", {"id": "x"}, None),
+    ("users", {"email": "x"}, None),
+    ("users", {"employee_id": "x"}, None),
+    ("trips", {"id": "x"}, None),
+    ("trips", {"status": "active"}, None),
+    ("trips", {"status": "active", "departure_time": {"$gte": datetime(2000, 1, 1)}},
+     [("departure_time", ASCENDING), ("id", ASCENDING)]),
+    ("trips", {"creator_id": "x"}, None),
+    ("trips", {"id": {"$in": ["x"]}}, None),
+    ("trips", {"departure_time": {"$gte": datetime(2000, 1, 1)}, "seats_remaining": {"$gt": 0},
+               "$or": [{"origin.address": {"$regex": "airport", "$options": "i"}},
+                       {"destination.address": {"$regex": "airport", "$options": "i"}}]}, None),
+    ("trips", {"id": "x", "trip_type": "personal_car"}, None),
+    ("trips", {"trip_type": "personal_car", "status": "active", "departure_time": {"$gte": datetime(2000, 1, 1)}},
+     [("departure_time", ASCENDING), ("id", ASCENDING)]),
+    ("bookings", {"trip_id": "x", "status": "confirmed"}, None),
+    ("bookings", {"trip_id": "x", "user_id": "x", "status": "confirmed"}, None),
+    ("bookings", {"user_id": "x", "status": "confirmed"}, None),
+    ("bookings", {"trip_id": "x"}, None),
+    ("join_requests", {"id": "x"}, None),
+    ("join_requests", {"trip_id": "x", "status": "approved"}, None),
+    ("join_requests", {"trip_id": "x", "requester_id": "x", "status": {"$in": ["pending", "approved"]}}, None),
+    ("join_requests", {"requester_id": "x", "status": "approved"}, None),
+    ("messages", {"trip_id": "x"}, [("timestamp", ASCENDING)]),
+    ("live_tracking", {"trip_id": "x"}, None),
+    ("live_tracking", {"trip_id": "x", "user_id": "x"}, None),
+    ("bus_stops", {"id": "x"}, None),
+    ("bus_stops", {"geo": {"$nearSphere": {"$geometry": {"type": "Point", "coordinates": [28.97, 41.0]},
+                                           "$maxDistance": 2000}}}, None),
+    ("taxi_bookings", {"id": "x"}, None),
+    ("taxi_bookings", {"id": "x", "user_id": "x"}, None),
+    ("taxi_bookings", {"user_id": "x"}, [("created_at", DESCENDING)]),
+    ("taxi_bookings", {"status": "searching", "pickup_time": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("taxi_bookings", {"status": "matching", "claimed_at": {"$lt": datetime(2000, 1, 1)}}, None),
+    ("payment_transactions", {"user_id": "x"}, [("created_at", DESCENDING)]),
+    ("payment_transactions", {"payment_session_id": "x", "user_id": "x"}, None),
+    ("payment_transactions", {"payment_session_id": "x"}, None),
+    ("wallet", {"user_id": "x"}, None),
+]
+
+async def ensure_indexes():
+    """Create all declared indexes; safe to run on every startup"""
+    for collection_name, indexes in COLLECTION_INDEXES.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Usually duplicate data blocking a unique index; keep serving
+            print(f"Error creating indexes on {collection_name}: {e}")
+
+def _plan_stages(plan: dict) -> List[str]:
+    """Flatten the stage names of an explain() plan tree"""
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(child_key), dict):
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+async def check_index_coverage() -> List[dict]:
+    """Explain every route query shape and return those that do a COLLSCAN"""
+    violations = []
+    for collection_name, query, sort in INDEX_COVERAGE_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            violations.append({"collection": collection_name, "query": query, "sort": sort})
+    return violations
+
+@app.on_event("startup")
+async def bootstrap_indexes():
+    await ensure_indexes()
+
+async def migrate_trip_store(batch_size: int = 500):
+    """Fold the legacy personal_car_trips collection into trips; safe to re-run"""
+    await trips_collection.update_many(
+        {"trip_type": {"$exists": False}},
+        {"$set": {"trip_type": "taxi"}}
+    )
+    
+    while True:
+        legacy_trips = await legacy_personal_car_trips_collection.find({}).limit(batch_size).to_list(length=None)
+        if not legacy_trips:
+            break
+        
+        operations = []
+        for trip in legacy_trips:
+            trip.pop("_id", None)
+            trip["trip_type"] = "personal_car"
+            operations.append(ReplaceOne({"id": trip["id"]}, trip, upsert=True))
+        await trips_collection.bulk_write(operations, ordered=False)
+        
+        # Only drop documents from the legacy collection once they are in trips
+        await legacy_personal_car_trips_collection.delete_many(
+            {"id": {"$in": [trip["id"] for trip in legacy_trips]}}
+        )
+
+@app.on_event("startup")
+async def bootstrap_trip_store():
+    await migrate_trip_store()
+
+def geojson_point(coordinates: dict) -> dict:
+    # GeoJSON orders positions as [longitude, latitude]
+    return {"type": "Point", "coordinates": [coordinates["lng"], coordinates["lat"]]}
+
+async def migrate_bus_stop_geometry():
+    """Give every bus stop a GeoJSON point for the 2dsphere index"""
+    stops = await bus_stops_collection.find(
+        {"geo": {"$exists": False}}, {"location.coordinates": 1}
+    ).to_list(length=None)
+    operations = [
+        UpdateOne({"_id": stop["_id"]}, {"$set": {"geo": geojson_point(stop["location"]["coordinates"])}})
+        for stop in stops
+    ]
+    if operations:
+        await bus_stops_collection.bulk_write(operations, ordered=False)
+
+@app.on_event("startup")
+async def bootstrap_bus_stop_geometry():
+    await migrate_bus_stop_geometry()
+
+# Version 2: origin/destination are always Location documents, never plain strings
+TRIP_SCHEMA_VERSION = 2
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def start_background_task(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def legacy_location(address: str) -> dict:
+    return {"address": address, "coordinates": {"lat": 0, "lng": 0}, "place_id": None}
+
+async def migrate_trip_locations(batch_size: int = 500):
+    """Rewrite legacy string origin/destination as Location documents and stamp schema_version"""
+    query = {"schema_version": {"$not": {"$gte": TRIP_SCHEMA_VERSION}}}
+    while True:
+        trips = await trips_collection.find(
+            query, {"origin": 1, "destination": 1}
+        ).limit(batch_size).to_list(length=None)
+        if not trips:
+            break
+        
+        operations = []
+        for trip in trips:
+            update = {"schema_version": TRIP_SCHEMA_VERSION}
+            for field in ("origin", "destination"):
+                if isinstance(trip.get(field), str):
+                    update[field] = legacy_location(trip[field])
+            operations.append(UpdateOne({"_id": trip["_id"]}, {"$set": update}))
+        await trips_collection.bulk_write(operations, ordered=False)
+
+async def run_trip_location_migration():
+    try:
+        await migrate_trip_locations()
+    except Exception as e:
+        print(f"Error migrating trip locations: {e}")
+
+@app.on_event("startup")
+async def start_trip_location_migration():
+    # Runs in the background so startup does not wait on large collections
+    start_background_task(run_trip_location_migration())
+
+# Trips store the provider's encoded route once, at full resolution, in route_polyline.
+# List views serve it simplified for ROUTE_LIST_ZOOM; simplified copies are kept in
+# memory only, so storage does not grow and list payloads shrink.
+ROUTE_LIST_ZOOM = float(os.environ.get('ROUTE_LIST_ZOOM', '12'))
+ROUTE_LIST_CACHE_SIZE = int(os.environ.get('ROUTE_LIST_CACHE_SIZE', '5000'))
+# Keyed by the full encoded polyline, which never changes in place
+route_list_cache = TTLCache(maxsize=ROUTE_LIST_CACHE_SIZE, ttl=86400)
+
+def route_polyline_for_zoom(encoded_polyline: Optional[str], zoom: Optional[float]) -> str:
+    """Full-resolution route, simplified for zoom when one is given"""
+    if not encoded_polyline or zoom is None:
+        return encoded_polyline or ""
+    return polyline.encode(polyline.simplify_for_zoom(polyline.decode(encoded_polyline), zoom))
+
+def list_route_polyline(encoded_polyline: Optional[str]) -> str:
+    """Route simplified for list maps"""
+    if not encoded_polyline:
+        return ""
+    simplified = route_list_cache.get(encoded_polyline)
+    if simplified is MISSING:
+        simplified = route_polyline_for_zoom(encoded_polyline, ROUTE_LIST_ZOOM)
+        route_list_cache.set(encoded_polyline, simplified)
+    return simplified
+
+async def find_trip(trip_id: str, trip_type: Optional[str] = None) -> Optional[dict]:
+    """Single lookup path for a trip by id, optionally restricted to one trip type"""
+    query = {"id": trip_id}
+    if trip_type:
+        query["trip_type"] = trip_type
+    return await trips_collection.find_one(query)
 
 # JWT Secret
 JWT_SECRET = "your-secret-key-here"
@@ -58,8 +340,48 @@ print(f"Google Maps API Key loaded: {'Yes' if GOOGLE_MAPS_API_KEY else 'No'}")
 if GOOGLE_MAPS_API_KEY:
     print(f"API Key length: {len(GOOGLE_MAPS_API_KEY)}")
     
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY) if GOOGLE_MAPS_API_KEY else None
-print(f"Google Maps client initialized: {'Yes' if gmaps else 'No'}")
+# One pooled async client for every maps call so requests never block the event loop;
+# GOOGLE_MAPS_BASE_URL can point at maps_standin.py for offline load tests
+maps_client = AsyncMapsClient(
+    api_key=GOOGLE_MAPS_API_KEY,
+    base_url=os.environ.get('GOOGLE_MAPS_BASE_URL', GOOGLE_MAPS_BASE_URL),
+    max_connections=int(os.environ.get('MAPS_MAX_CONNECTIONS', '20')),
+    max_concurrency=int(os.environ.get('MAPS_MAX_CONCURRENCY', '10')),
+    timeout=float(os.environ.get('MAPS_TIMEOUT_SECONDS', '5')),
+    max_retries=int(os.environ.get('MAPS_MAX_RETRIES', '2')),
+    latency_budgets={
+        "directions": float(os.environ.get('MAPS_DIRECTIONS_BUDGET_SECONDS', '3')),
+        "distance_matrix": float(os.environ.get('MAPS_DISTANCE_MATRIX_BUDGET_SECONDS', '3')),
+        "geocode": float(os.environ.get('MAPS_GEOCODE_BUDGET_SECONDS', '2'))
+    },
+    breaker_options={
+        "window_size": int(os.environ.get('MAPS_BREAKER_WINDOW', '20')),
+        "failure_rate_threshold": float(os.environ.get('MAPS_BREAKER_FAILURE_RATE', '0.5')),
+        "slow_call_seconds": float(os.environ.get('MAPS_BREAKER_SLOW_CALL_SECONDS', '1.5')),
+        "open_seconds": float(os.environ.get('MAPS_BREAKER_OPEN_SECONDS', '30'))
+    }
+) if GOOGLE_MAPS_API_KEY else None
+print(f"Google Maps client initialized: {'Yes' if maps_client else 'No'}")
+
+# Routing for trips, detours and walking distances. The local provider estimates
+# from haversine distance and Istanbul hourly speeds: it serves degraded mode when
+# Google is not configured (or ROUTING_PROVIDER=local for load tests), answers
+# while a Google circuit is open or over its latency budget, and always
+# pre-screens detours before a paid routing call.
+local_routing = LocalRoutingProvider(road_factor=float(os.environ.get('ROUTING_ROAD_FACTOR', '1.35')))
+if maps_client and os.environ.get('ROUTING_PROVIDER', 'google') == 'google':
+    routing_provider = FallbackRoutingProvider(GoogleRoutingProvider(maps_client), local_routing)
+else:
+    routing_provider = local_routing
+print(f"Routing provider: {routing_provider.name}")
+
+# Skip the paid detour call when the local estimate exceeds the limit by this factor
+ROUTING_PRESCREEN_FACTOR = float(os.environ.get('ROUTING_PRESCREEN_FACTOR', '2.0'))
+
+@app.on_event("shutdown")
+async def close_maps_client():
+    if maps_client:
+        await maps_client.aclose()
 
 # Twilio client
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
@@ -80,14 +402,144 @@ WALLET_PACKAGES = {
     "jumbo": {"amount": 100.0, "currency": "try", "name": "Jumbo Top-up"}
 }
 
-# Redis client for real-time features
-try:
-    redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
-    redis_client.ping()
-    print("Redis client initialized: Yes")
-except:
-    redis_client = None
-    print("Redis client initialized: No")
+# Redis client for the shared cache tier. Async, with bounded timeouts, so a
+# stalled Redis costs a cache miss rather than blocking the event loop.
+REDIS_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('REDIS_CONNECT_TIMEOUT_SECONDS', '0.5'))
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.environ.get('REDIS_SOCKET_TIMEOUT_SECONDS', '0.25'))
+redis_client = redis.Redis(
+    host='localhost',
+    port=6379,
+    decode_responses=True,
+    socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+    socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS
+)
+
+# User document cache. Entries are dropped on profile update in this worker
+# and otherwise expire after USER_CACHE_TTL_SECONDS.
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+# Route cache for calculate_trip_route. Crew commutes repeat the same few hundred
+# origin/destination pairs, so endpoints are snapped to a grid before lookup.
+ROUTE_CACHE_TTL_SECONDS = float(os.environ.get('ROUTE_CACHE_TTL_SECONDS', '86400'))
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', '5000'))
+ROUTE_CACHE_GRID_DEGREES = float(os.environ.get('ROUTE_CACHE_GRID_DEGREES', '0.001'))  # ~110 m
+route_cache = TieredCache("route", maxsize=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL_SECONDS, redis_client=redis_client)
+
+def snap_coordinate(value: float, grid: float = ROUTE_CACHE_GRID_DEGREES) -> float:
+    return round(round(value / grid) * grid, 6)
+
+def route_cache_key(origin_coords: dict, destination_coords: dict) -> str:
+    return (f"{snap_coordinate(origin_coords['lat'])},{snap_coordinate(origin_coords['lng'])}|"
+            f"{snap_coordinate(destination_coords['lat'])},{snap_coordinate(destination_coords['lng'])}")
+
+# Geocode cache keyed by normalized address. Misses are cached briefly so a
+# mistyped address is not re-sent to Google on every keystroke.
+GEOCODE_CACHE_TTL_SECONDS = float(os.environ.get('GEOCODE_CACHE_TTL_SECONDS', '2592000'))
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.environ.get('GEOCODE_NEGATIVE_TTL_SECONDS', '300'))
+GEOCODE_CACHE_SIZE = int(os.environ.get('GEOCODE_CACHE_SIZE', '20000'))
+GEOCODE_SEED_FILE = os.environ.get('GEOCODE_SEED_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode_seed.json'))
+geocode_cache = TieredCache("geocode", maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL_SECONDS, redis_client=redis_client)
+
+# Turkish dotted/dotless i must be folded before lower(), then the remaining
+# Turkish letters map to ASCII so "İstanbul Havalimanı" == "istanbul havalimani"
+TURKISH_CASE_FOLD = str.maketrans({"I": "ı", "İ": "i"})
+TURKISH_ASCII_FOLD = str.maketrans({"ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u"})
+
+def normalize_address(address: str) -> str:
+    """Case-, diacritic-, punctuation- and whitespace-insensitive address key"""
+    folded = address.translate(TURKISH_CASE_FOLD).lower().translate(TURKISH_ASCII_FOLD)
+    decomposed = unicodedata.normalize("NFKD", folded)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", stripped).split())
+
+def load_geocode_seed(path: str) -> Dict[str, dict]:
+    """Known airports and company facilities, keyed by every normalized alias"""
+    seed = {}
+    try:
+        with open(path, encoding="utf-8") as seed_file:
+            entries = json.load(seed_file)
+    except (OSError, ValueError) as e:
+        print(f"Error loading geocode seed: {e}")
+        return seed
+    
+    for entry in entries:
+        location = {"address": entry["address"], "coordinates": entry["coordinates"], "place_id": entry.get("place_id")}
+        for alias in entry["aliases"] + [entry["address"]]:
+            seed[normalize_address(alias)] = location
+    return seed
+
+geocode_seed = load_geocode_seed(GEOCODE_SEED_FILE)
+geocode_seed_hits = 0
+
+# Precomputed road distances for common airport corridors, so the most
+# frequent shared taxi fares need no routing call at all
+FARE_CORRIDORS_FILE = os.environ.get('FARE_CORRIDORS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fare_corridors.json'))
+
+def load_fare_corridors(path: str) -> tuple:
+    """Zones by id and corridor distances keyed by (zone, zone) in both directions"""
+    try:
+        with open(path, encoding="utf-8") as corridors_file:
+            table = json.load(corridors_file)
+    except (OSError, ValueError) as e:
+        print(f"Error loading fare corridors: {e}")
+        return {}, {}
+    
+    distances = {}
+    for corridor in table["corridors"]:
+        distances[(corridor["from"], corridor["to"])] = corridor["distance_km"]
+        distances[(corridor["to"], corridor["from"])] = corridor["distance_km"]
+    return table["zones"], distances
+
+fare_corridor_zones, fare_corridor_distances = load_fare_corridors(FARE_CORRIDORS_FILE)
+
+# Walking distances from a (grid-snapped) location to a bus stop. Only the
+# BUS_STOP_CANDIDATE_LIMIT nearest stops by straight line are ever priced.
+BUS_STOP_CANDIDATE_LIMIT = int(os.environ.get('BUS_STOP_CANDIDATE_LIMIT', '10'))
+WALKING_CACHE_TTL_SECONDS = float(os.environ.get('WALKING_CACHE_TTL_SECONDS', '604800'))
+WALKING_CACHE_SIZE = int(os.environ.get('WALKING_CACHE_SIZE', '20000'))
+walking_cache = TieredCache("walk", maxsize=WALKING_CACHE_SIZE, ttl=WALKING_CACHE_TTL_SECONDS, redis_client=redis_client)
+
+def walking_cache_key(coordinates: dict, stop_id: str) -> str:
+    return f"{snap_coordinate(coordinates['lat'])},{snap_coordinate(coordinates['lng'])}|{stop_id}"
+
+# Distance matrix proxy: elements cached per origin/destination pair, requests
+# split into tiles within Google's per-request limits
+MATRIX_CACHE_TTL_SECONDS = float(os.environ.get('MATRIX_CACHE_TTL_SECONDS', '86400'))
+MATRIX_NEGATIVE_TTL_SECONDS = float(os.environ.get('MATRIX_NEGATIVE_TTL_SECONDS', '300'))
+MATRIX_CACHE_SIZE = int(os.environ.get('MATRIX_CACHE_SIZE', '50000'))
+matrix_cache = TieredCache("matrix", maxsize=MATRIX_CACHE_SIZE, ttl=MATRIX_CACHE_TTL_SECONDS, redis_client=redis_client)
+
+@app.on_event("startup")
+async def connect_redis():
+    """Drop the Redis tier from every shared cache when Redis is unreachable at startup"""
+    try:
+        await redis_client.ping()
+        print("Redis client initialized: Yes")
+    except Exception:
+        print("Redis client initialized: No")
+        for cache in (route_cache, geocode_cache, walking_cache, matrix_cache):
+            cache.redis = None
+
+@app.on_event("shutdown")
+async def close_redis():
+    await redis_client.aclose()
+
+MATRIX_MAX_SIDE = 25  # origins or destinations per request
+MATRIX_MAX_ELEMENTS = 100  # origins x destinations per request
+MATRIX_MAX_REQUEST_ELEMENTS = int(os.environ.get('MATRIX_MAX_REQUEST_ELEMENTS', '2500'))
+MATRIX_TILE_CONCURRENCY = int(os.environ.get('MATRIX_TILE_CONCURRENCY', '4'))
+matrix_rate_limiter = RateLimiter(float(os.environ.get('MATRIX_ELEMENTS_PER_SECOND', '1000')))
+
+def matrix_cache_key(origin: str, destination: str) -> str:
+    return f"{normalize_address(origin)}|{normalize_address(destination)}"
+
+# Detour of a trip's stored route through a rider pickup, keyed by (trip id,
+# grid-snapped pickup); repeat bookings and pickup previews skip the routing call
+DETOUR_CACHE_TTL_SECONDS = float(os.environ.get('DETOUR_CACHE_TTL_SECONDS', '3600'))
+DETOUR_CACHE_SIZE = int(os.environ.get('DETOUR_CACHE_SIZE', '10000'))
+detour_cache = TTLCache(maxsize=DETOUR_CACHE_SIZE, ttl=DETOUR_CACHE_TTL_SECONDS)
 
 # Security
 security = HTTPBearer()
@@ -95,7 +547,7 @@ security = HTTPBearer()
 # Helper function for WebSocket
 async def get_trip_participants(trip_id: str) -> List[str]:
     """Get all user IDs participating in a trip (creator + riders)"""
-    trip = await trips_collection.find_one({"id": trip_id})
+    trip = await find_trip(trip_id)
     if not trip:
         return []
     
@@ -310,6 +762,26 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return hash_password(password) == hashed
 
+def decode_location(value) -> Location:
+    """Build a Location from a stored trip field without re-running validation"""
+    if isinstance(value, dict) and isinstance(value.get("address"), str) and isinstance(value.get("coordinates"), dict):
+        # Written by this API from a validated Location, so skip validation
+        return Location.model_construct(
+            address=value["address"],
+            coordinates=value["coordinates"],
+            place_id=value.get("place_id")
+        )
+    
+    # Legacy string locations not yet touched by migrate_trip_locations
+    if isinstance(value, str):
+        return Location.model_construct(**legacy_location(value))
+    
+    try:
+        return Location(**value)
+    except Exception as e:
+        print(f"Error parsing location: {e}")
+        return Location(address=str(value), coordinates={"lat": 0, "lng": 0})
+
 def create_jwt_token(user_id: str) -> str:
     payload = {
         "user_id": user_id,
@@ -326,18 +798,45 @@ def verify_jwt_token(token: str) -> dict:
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     token = credentials.credentials
     payload = verify_jwt_token(token)
     user_id = payload["user_id"]
-    user = users_collection.find_one({"id": user_id})
+    user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-def get_or_create_wallet(user_id: str) -> dict:
+async def get_user_by_id(user_id: str) -> Optional[dict]:
+    """Look up a user document, served from user_cache when possible"""
+    user = user_cache.get(user_id, None)
+    if user is None:
+        user = await users_collection.find_one({"id": user_id})
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+async def get_users_by_ids(user_ids: List[str]) -> Dict[str, dict]:
+    """Resolve many user ids with at most one $in query; missing users are left out"""
+    users = {}
+    missing_ids = []
+    for user_id in set(user_ids):
+        user = user_cache.get(user_id, None)
+        if user is None:
+            missing_ids.append(user_id)
+        else:
+            users[user_id] = user
+    
+    if missing_ids:
+        async for user in users_collection.find({"id": {"$in": missing_ids}}):
+            user_cache.set(user["id"], user)
+            users[user["id"]] = user
+    
+    return users
+
+async def get_or_create_wallet(user_id: str) -> dict:
     """Get or create wallet for a user"""
-    wallet = wallet_collection.find_one({"user_id": user_id})
+    wallet = await wallet_collection.find_one({"user_id": user_id})
     if not wallet:
         wallet = {
             "user_id": user_id,
@@ -345,19 +844,19 @@ def get_or_create_wallet(user_id: str) -> dict:
             "currency": "try",
             "last_updated": datetime.utcnow()
         }
-        wallet_collection.insert_one(wallet)
+        await wallet_collection.insert_one(wallet)
     return wallet
 
-def update_wallet_balance(user_id: str, amount: float, transaction_type: str = "topup") -> dict:
+async def update_wallet_balance(user_id: str, amount: float, transaction_type: str = "topup") -> dict:
     """Update wallet balance and return updated wallet"""
-    wallet = get_or_create_wallet(user_id)
+    wallet = await get_or_create_wallet(user_id)
     
     if transaction_type == "payment" and wallet["balance"] < amount:
         raise HTTPException(status_code=400, detail="Insufficient wallet balance")
     
     new_balance = wallet["balance"] + amount if transaction_type == "topup" else wallet["balance"] - amount
     
-    wallet_collection.update_one(
+    await wallet_collection.update_one(
         {"user_id": user_id},
         {
             "$set": {
@@ -371,7 +870,7 @@ def update_wallet_balance(user_id: str, amount: float, transaction_type: str = "
     wallet["last_updated"] = datetime.utcnow()
     return wallet
 
-def create_wallet_transaction(user_id: str, transaction_type: str, amount: float, description: str, 
+async def create_wallet_transaction(user_id: str, transaction_type: str, amount: float, description: str, 
                              payment_session_id: str = None, status: str = "pending") -> str:
     """Create a wallet transaction record"""
     transaction_id = str(uuid.uuid4())
@@ -387,85 +886,205 @@ def create_wallet_transaction(user_id: str, transaction_type: str, amount: float
         "payment_session_id": payment_session_id
     }
     
-    payment_transactions_collection.insert_one(transaction)
+    await payment_transactions_collection.insert_one(transaction)
     return transaction_id
 
-def calculate_trip_route(origin: Location, destination: Location) -> dict:
-    """Calculate route information using Google Maps"""
-    if not gmaps:
-        return {"distance_km": 0, "duration_minutes": 0, "route_polyline": ""}
+async def calculate_trip_route(origin: Location, destination: Location, departure_time: Optional[datetime] = None,
+                               with_polyline: bool = True) -> dict:
+    """Calculate route information through the airport table, route_cache and the routing provider.
+
+    "estimated" is True when the route is a local estimate rather than a routed one.
+    """
+    if not with_polyline:
+        tabled_route = lookup_airport_travel_time(origin.coordinates, destination.coordinates, departure_time)
+        if tabled_route:
+            return dict(tabled_route, route_polyline="")
+    
+    cache_key = route_cache_key(origin.coordinates, destination.coordinates)
+    cached_route = await route_cache.get(cache_key)
+    if cached_route is not MISSING:
+        return dict(cached_route, estimated=False)
     
     try:
-        directions_result = gmaps.directions(
-            origin=f"{origin.coordinates['lat']},{origin.coordinates['lng']}",
-            destination=f"{destination.coordinates['lat']},{destination.coordinates['lng']}",
-            mode="driving"
-        )
-        
-        if directions_result and len(directions_result) > 0:
-            route = directions_result[0]
-            leg = route["legs"][0]
-            
-            return {
-                "distance_km": leg["distance"]["value"] / 1000,  # Convert meters to km
-                "duration_minutes": leg["duration"]["value"] / 60,  # Convert seconds to minutes
-                "route_polyline": route["overview_polyline"]["points"]
+        route = await routing_provider.route(origin.coordinates, destination.coordinates, departure_time=departure_time)
+        if route:
+            route_info = {
+                "distance_km": route["distance_km"],
+                "duration_minutes": route["duration_minutes"],
+                "route_polyline": route["route_polyline"]
             }
+            # Estimates are cheap and time-of-day dependent; only real routes are shared
+            if not route["estimated"]:
+                await route_cache.set(cache_key, route_info)
+            return dict(route_info, estimated=route["estimated"])
     except Exception as e:
         print(f"Error calculating route: {e}")
     
-    return {"distance_km": 0, "duration_minutes": 0, "route_polyline": ""}
+    return {"distance_km": 0, "duration_minutes": 0, "route_polyline": "", "estimated": True}
 
-def check_rider_compatibility(trip_origin: Location, trip_destination: Location, rider_location: Location, max_detour_minutes: int = 7) -> dict:
-    """Check if a rider location is compatible with a trip"""
-    if not gmaps:
-        return {"compatible": False, "reason": "Maps service not available"}
+def detour_cache_key(trip_id: str, pickup_coords: dict) -> tuple:
+    return (trip_id, snap_coordinate(pickup_coords["lat"]), snap_coordinate(pickup_coords["lng"]))
+
+async def prescreen_detour(trip_origin: dict, trip_destination: dict, rider_location: Location,
+                           max_detour_minutes: int, departure_time: Optional[datetime]) -> Optional[dict]:
+    """Locally estimated detour when it is clearly too long to be worth a routing call"""
+    direct = await local_routing.route(trip_origin, trip_destination, departure_time=departure_time)
+    detour = await local_routing.route(
+        trip_origin, trip_destination, waypoints=[rider_location.coordinates], departure_time=departure_time
+    )
+    additional_time = detour["duration_minutes"] - direct["duration_minutes"]
+    if additional_time <= max_detour_minutes * ROUTING_PRESCREEN_FACTOR:
+        return None
     
-    try:
-        # Calculate original route
-        original_directions = gmaps.directions(
-            origin=f"{trip_origin.coordinates['lat']},{trip_origin.coordinates['lng']}",
-            destination=f"{trip_destination.coordinates['lat']},{trip_destination.coordinates['lng']}",
-            mode="driving"
+    return {
+        "original_duration_minutes": direct["duration_minutes"],
+        "detour_duration_minutes": detour["duration_minutes"],
+        "additional_time_minutes": additional_time,
+        "estimated": True
+    }
+
+async def replace_estimated_trip_route(trip: dict, origin: Location, destination: Location,
+                                      departure_time: Optional[datetime]) -> dict:
+    """Route a trip whose stored base route is missing or estimated, storing it when routed"""
+    route_info = await calculate_trip_route(origin, destination, departure_time)
+    if not route_info["estimated"] and route_info["duration_minutes"]:
+        await trips_collection.update_one(
+            {"id": trip["id"], "route_estimated": {"$ne": False}},
+            {"$set": {
+                "distance_km": route_info["distance_km"],
+                "duration_minutes": route_info["duration_minutes"],
+                "route_estimated": False,
+                "route_polyline": route_info["route_polyline"]
+            }}
         )
-        
-        if not original_directions:
-            return {"compatible": False, "reason": "Original route not found"}
-        
-        original_duration = original_directions[0]["legs"][0]["duration"]["value"]
-        
+    return route_info
+
+async def check_rider_compatibility(trip: dict, rider_location: Location, max_detour_minutes: int = 7) -> dict:
+    """Check if a rider location is compatible with a trip, reusing the trip's stored route"""
+    cache_key = detour_cache_key(trip["id"], rider_location.coordinates)
+    cached_result = detour_cache.get(cache_key)
+    if cached_result is not MISSING:
+        return dict(cached_result, compatible=cached_result["additional_time_minutes"] <= max_detour_minutes)
+    
+    trip_origin = decode_location(trip["origin"])
+    trip_destination = decode_location(trip["destination"])
+    departure_time = trip.get("departure_time") if isinstance(trip.get("departure_time"), datetime) else None
+    
+    if routing_provider is not local_routing:
+        rejected = await prescreen_detour(
+            trip_origin.coordinates, trip_destination.coordinates, rider_location, max_detour_minutes, departure_time
+        )
+        if rejected:
+            return dict(rejected, compatible=False)
+    
+    # create_trip stores the base route; trips created without one, or with only a
+    # local estimate, have it routed again and stored once a real route is available
+    original_duration_minutes = trip.get("duration_minutes")
+    base_estimated = bool(trip.get("route_estimated"))
+    if not original_duration_minutes or base_estimated:
+        base_route = await replace_estimated_trip_route(trip, trip_origin, trip_destination, departure_time)
+        original_duration_minutes = base_route["duration_minutes"]
+        base_estimated = base_route["estimated"]
+    if not original_duration_minutes:
+        return {"compatible": False, "reason": "Original route not found"}
+    
+    try:
         # Calculate detour route
-        detour_directions = gmaps.directions(
-            origin=f"{trip_origin.coordinates['lat']},{trip_origin.coordinates['lng']}",
-            destination=f"{trip_destination.coordinates['lat']},{trip_destination.coordinates['lng']}",
-            waypoints=[f"{rider_location.coordinates['lat']},{rider_location.coordinates['lng']}"],
-            mode="driving"
+        detour = await routing_provider.route(
+            trip_origin.coordinates,
+            trip_destination.coordinates,
+            waypoints=[rider_location.coordinates],
+            departure_time=departure_time
         )
         
-        if not detour_directions:
+        if not detour:
             return {"compatible": False, "reason": "Detour route not found"}
         
-        detour_duration = sum(leg["duration"]["value"] for leg in detour_directions[0]["legs"])
-        additional_time = (detour_duration - original_duration) / 60  # Convert to minutes
-        
-        compatible = additional_time <= max_detour_minutes
-        
-        return {
-            "compatible": compatible,
-            "original_duration_minutes": original_duration / 60,
-            "detour_duration_minutes": detour_duration / 60,
-            "additional_time_minutes": additional_time
+        if base_estimated and not detour["estimated"]:
+            # No routed base to subtract a routed detour from; estimate both instead
+            detour = await local_routing.route(
+                trip_origin.coordinates,
+                trip_destination.coordinates,
+                waypoints=[rider_location.coordinates],
+                departure_time=departure_time
+            )
+        if detour["estimated"]:
+            # Compare like with like when the detour came from the local fallback
+            original_duration_minutes = (await local_routing.route(
+                trip_origin.coordinates, trip_destination.coordinates, departure_time=departure_time
+            ))["duration_minutes"]
+        additional_time = detour["duration_minutes"] - original_duration_minutes
+        
+        result = {
+            "original_duration_minutes": original_duration_minutes,
+            "detour_duration_minutes": detour["duration_minutes"],
+            "additional_time_minutes": additional_time,
+            "estimated": detour["estimated"]
         }
+        if not detour["estimated"]:
+            detour_cache.set(cache_key, result)
+        return dict(result, compatible=additional_time <= max_detour_minutes)
     except Exception as e:
         print(f"Error checking rider compatibility: {e}")
         return {"compatible": False, "reason": "Error calculating compatibility"}
 
+# Fields a trip list view needs; notes are only served by GET /api/trips/{trip_id}
+# or with view=full. Lists simplify route_polyline; only the detail endpoint serves it in full.
+TRIP_SUMMARY_FIELDS = [
+    "id", "trip_type", "creator_id", "creator_name", "origin", "destination", "departure_time",
+    "available_seats", "booked_count", "seats_remaining", "max_riders", "price_per_person",
+    "status", "created_at", "distance_km", "duration_minutes", "route_polyline",
+    "car_model", "car_color", "license_plate", "nearest_bus_stop"
+]
+TRIP_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in TRIP_SUMMARY_FIELDS}}
+TRIP_FULL_PROJECTION = {"_id": 0}
+
+def trip_list_projection(view: str) -> dict:
+    if view == "summary":
+        return TRIP_SUMMARY_PROJECTION
+    if view == "full":
+        return TRIP_FULL_PROJECTION
+    raise HTTPException(status_code=400, detail="view must be 'summary' or 'full'")
+
 # API Routes
+# Cache metrics
+@app.get("/api/metrics/cache")
+async def get_cache_metrics():
+    """Hit/miss counters for the in-process caches"""
+    return {
+        "users": user_cache.stats(),
+        "routes": route_cache.stats(),
+        "geocodes": {
+            **geocode_cache.stats(),
+            "seed_entries": len(geocode_seed),
+            "seed_hits": geocode_seed_hits
+        },
+        "walking_distances": walking_cache.stats(),
+        "distance_matrix": matrix_cache.stats(),
+        "detours": detour_cache.stats()
+    }
+
+@app.get("/api/metrics/maps")
+async def get_maps_metrics():
+    """Upstream maps request counters, including calls saved by single-flight coalescing"""
+    return {
+        "routing_provider": routing_provider.name,
+        "routing_fallbacks": getattr(routing_provider, "fallbacks", 0),
+        "client": maps_client.stats() if maps_client else None,
+        "airport_travel_table": {"entries": len(airport_travel_table), **airport_travel_table_state}
+    }
+
+@app.get("/api/metrics/taxi-matching")
+async def get_taxi_matching_metrics():
+    """Background batch matcher passes and the rides it has formed"""
+    return {"interval_seconds": TAXI_BATCH_INTERVAL_SECONDS,
+            "min_interval_seconds": TAXI_BATCH_MIN_INTERVAL_SECONDS, **taxi_batch_state}
+
 # Wallet endpoints
 @app.get("/api/wallet")
 async def get_wallet(current_user: dict = Depends(get_current_user)):
     """Get user's wallet balance"""
-    wallet = get_or_create_wallet(current_user["id"])
+    wallet = await get_or_create_wallet(current_user["id"])
     return {
         "user_id": wallet["user_id"],
         "balance": wallet["balance"],
@@ -513,7 +1132,7 @@ async def create_wallet_topup(request: WalletTopupRequest, current_user: dict =
         session = await stripe_checkout.create_checkout_session(checkout_request)
         
         # Create transaction record
-        transaction_id = create_wallet_transaction(
+        transaction_id = await create_wallet_transaction(
             user_id=current_user["id"],
             transaction_type="topup",
             amount=amount,
@@ -539,7 +1158,7 @@ async def get_wallet_payment_status(session_id: str, current_user: dict = Depend
     
     try:
         # Check transaction exists for this user
-        transaction = payment_transactions_collection.find_one({
+        transaction = await payment_transactions_collection.find_one({
             "payment_session_id": session_id,
             "user_id": current_user["id"]
         })
@@ -562,16 +1181,16 @@ async def get_wallet_payment_status(session_id: str, current_user: dict = Depend
         # Update transaction status
         if checkout_status.payment_status == "paid" and transaction["status"] != "completed":
             # Update wallet balance
-            update_wallet_balance(current_user["id"], transaction["amount"], "topup")
+            await update_wallet_balance(current_user["id"], transaction["amount"], "topup")
             
             # Update transaction status
-            payment_transactions_collection.update_one(
+            await payment_transactions_collection.update_one(
                 {"payment_session_id": session_id},
                 {"$set": {"status": "completed"}}
             )
             
         elif checkout_status.status == "expired":
-            payment_transactions_collection.update_one(
+            await payment_transactions_collection.update_one(
                 {"payment_session_id": session_id},
                 {"$set": {"status": "failed"}}
             )
@@ -588,7 +1207,7 @@ async def get_wallet_payment_status(session_id: str, current_user: dict = Depend
 
 @app.post("/api/taxi-booking/request")
 async def request_taxi_booking(booking_data: TaxiBookingRequest, current_user: dict = Depends(get_current_user)):
-    """Request a taxi booking and find compatible riders"""
+    """Request a taxi booking; the background batch matcher finds compatible riders"""
     
     # Create taxi booking request
     booking_id = str(uuid.uuid4())
@@ -608,115 +1227,26 @@ async def request_taxi_booking(booking_data: TaxiBookingRequest, current_user: d
     }
     
     # Store in a taxi_bookings collection
-    db.taxi_bookings.insert_one(booking_request)
+    await taxi_bookings_collection.insert_one(booking_request)
     
-    # Find compatible riders within 5-7 minutes
-    compatible_riders = find_compatible_riders(booking_data, current_user)
+    # Matching runs in the background batch matcher, which notifies every rider
+    # over the websocket; wake it so this request is in the next pass
+    taxi_batch_wakeup.set()
     
-    if compatible_riders:
-        # Create a shared taxi trip
-        trip_id = await create_shared_taxi_trip(booking_data, current_user, compatible_riders)
-        
-        # Update booking status
-        db.taxi_bookings.update_one(
-            {"id": booking_id},
-            {"$set": {"status": "matched", "trip_id": trip_id}}
-        )
-        
-        # Send notifications to all riders
-        for rider in compatible_riders:
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "taxi_match_found",
-                    "trip_id": trip_id,
-                    "message": f"Taxi sharing match found! {current_user['name']} and others are going your direction.",
-                    "pickup_time": booking_data.pickup_time.isoformat()
-                }),
-                rider["user_id"]
-            )
-        
-        return {
-            "message": "Compatible riders found! Taxi booking created.",
-            "booking_id": booking_id,
-            "trip_id": trip_id,
-            "riders_count": len(compatible_riders) + 1,
-            "estimated_cost": calculate_shared_cost(booking_data.origin, booking_data.destination, len(compatible_riders) + 1)
-        }
-    else:
-        # No compatible riders found
-        return {
-            "message": "Taxi booking requested. We'll notify you when compatible riders are found.",
-            "booking_id": booking_id,
-            "status": "searching",
-            "pickup_time": booking_data.pickup_time.isoformat()
-        }
-
-def find_compatible_riders(booking_data: TaxiBookingRequest, current_user: dict) -> list:
-    """Find riders going in similar direction within time window"""
-    
-    # Time window: +/- 30 minutes from requested pickup time
-    time_start = booking_data.pickup_time - timedelta(minutes=30)
-    time_end = booking_data.pickup_time + timedelta(minutes=30)
-    
-    # Find other taxi booking requests in similar time window
-    potential_matches = list(db.taxi_bookings.find({
-        "user_id": {"$ne": current_user["id"]},
+    return {
+        "message": "Taxi booking requested. We'll notify you when compatible riders are found.",
+        "booking_id": booking_id,
         "status": "searching",
-        "pickup_time": {"$gte": time_start, "$lte": time_end}
-    }))
-    
-    compatible_riders = []
-    
-    for booking in potential_matches:
-        try:
-            # Calculate distance between pickup locations
-            origin_distance = calculate_distance_between_points(
-                booking_data.origin.coordinates,
-                booking["origin"]["coordinates"]
-            )
-            
-            # Calculate distance between destination locations  
-            dest_distance = calculate_distance_between_points(
-                booking_data.destination.coordinates,
-                booking["destination"]["coordinates"]
-            )
-            
-            # Check if pickup and destination are within 5-7 km (approximately 5-7 min drive)
-            if origin_distance <= 7 and dest_distance <= 7:
-                # Calculate time difference
-                time_diff = abs((booking_data.pickup_time - booking["pickup_time"]).total_seconds() / 60)
-                
-                if time_diff <= booking_data.max_waiting_time:
-                    compatible_riders.append(booking)
-                    
-        except Exception as e:
-            print(f"Error calculating compatibility: {e}")
-            continue
-    
-    return compatible_riders
+        "pickup_time": booking_data.pickup_time.isoformat()
+    }
 
 def calculate_distance_between_points(coord1: dict, coord2: dict) -> float:
     """Calculate distance between two coordinates in km using haversine formula"""
-    import math
-    
-    lat1, lon1 = coord1["lat"], coord1["lng"]
-    lat2, lon2 = coord2["lat"], coord2["lng"]
-    
-    # Haversine formula
-    R = 6371  # Earth's radius in km
-    
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return geo.haversine_km(coord1, coord2)
 
-async def create_shared_taxi_trip(booking_data: TaxiBookingRequest, primary_user: dict, riders: list) -> str:
-    """Create a shared taxi trip for compatible riders"""
-    
-    trip_id = str(uuid.uuid4())
+async def create_shared_taxi_trip(trip_id: str, booking_data: TaxiBookingRequest, primary_user: dict, riders: list,
+                                  price_per_person: Optional[float] = None) -> str:
+    """Create a shared taxi trip for compatible riders; their bookings are updated by the caller"""
     
     # Calculate average pickup time
     all_times = [booking_data.pickup_time] + [r["pickup_time"] for r in riders]
@@ -726,6 +1256,7 @@ async def create_shared_taxi_trip(booking_data: TaxiBookingRequest, primary_user
     trip = {
         "id": trip_id,
         "trip_type": "shared_taxi",
+        "schema_version": TRIP_SCHEMA_VERSION,
         "creator_id": primary_user["id"],
         "creator_name": primary_user["name"],
         "origin": booking_data.origin.dict(),
@@ -733,7 +1264,11 @@ async def create_shared_taxi_trip(booking_data: TaxiBookingRequest, primary_user
         "departure_time": avg_pickup_time,
         "max_riders": 3,
         "available_seats": max(0, 3 - len(riders)),
-        "price_per_person": calculate_shared_cost(booking_data.origin, booking_data.destination, len(riders) + 1),
+        "booked_count": 0,
+        "seats_remaining": max(0, 3 - len(riders)),
+        "price_per_person": price_per_person if price_per_person is not None else await calculate_shared_cost(
+            booking_data.origin, booking_data.destination, len(riders) + 1
+        ),
         "notes": f"Shared taxi ride. {booking_data.notes}",
         "status": "confirmed",
         "created_at": datetime.utcnow(),
@@ -741,6 +1276,7 @@ async def create_shared_taxi_trip(booking_data: TaxiBookingRequest, primary_user
             {
                 "user_id": primary_user["id"],
                 "user_name": primary_user["name"],
+                "booking_id": primary_user["booking_id"],
                 "pickup_location": booking_data.origin.dict(),
                 "status": "confirmed"
             }
@@ -748,57 +1284,462 @@ async def create_shared_taxi_trip(booking_data: TaxiBookingRequest, primary_user
             {
                 "user_id": r["user_id"],
                 "user_name": r["user_name"],
+                "booking_id": r["id"],
                 "pickup_location": r["origin"],
                 "status": "confirmed"
             } for r in riders
         ]
     }
     
-    trips_collection.insert_one(trip)
+    await trips_collection.insert_one(trip)
     
-    # Update all rider bookings to matched status
-    rider_ids = [r["id"] for r in riders]
-    db.taxi_bookings.update_many(
-        {"id": {"$in": rider_ids}},
-        {"$set": {"status": "matched", "trip_id": trip_id}}
+    return trip_id
+
+# Job leases: one document per background job that a single worker at a time may
+# run. A lease expires on its own, so a worker that dies holding one only delays the job
+job_leases_collection = db.job_leases
+WORKER_ID = str(uuid.uuid4())
+
+async def acquire_job_lease(lease_id: str, hold_seconds: float) -> bool:
+    """Take the lease for hold_seconds unless another worker holds it or it has not expired"""
+    now = datetime.utcnow()
+    try:
+        await job_leases_collection.update_one(
+            {"_id": lease_id, "expires_at": {"$lt": now}},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=hold_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and has not expired
+        return False
+    return True
+
+async def release_job_lease(lease_id: str, hold_seconds: float):
+    """Let the lease expire hold_seconds from now, keeping other workers off the job until then"""
+    await job_leases_collection.update_one(
+        {"_id": lease_id, "holder": WORKER_ID},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=hold_seconds)}}
+    )
+
+# Background batch matcher: periodically groups every open taxi-share request into
+# shared rides, so a request that found nobody is matched once compatible riders arrive
+TAXI_BATCH_INTERVAL_SECONDS = float(os.environ.get('TAXI_BATCH_INTERVAL_SECONDS', '30'))
+# Idle time after every pass, across all workers, however often new requests wake the matcher
+TAXI_BATCH_MIN_INTERVAL_SECONDS = float(os.environ.get('TAXI_BATCH_MIN_INTERVAL_SECONDS', '5'))
+TAXI_BATCH_CLAIM_TIMEOUT_SECONDS = 300
+TAXI_BATCH_LEASE_ID = "taxi_batch_matcher"
+TAXI_BATCH_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "user_name": 1, "origin": 1, "destination": 1,
+    "pickup_time": 1, "max_waiting_time": 1, "notes": 1
+}
+
+# Set by new requests so the matcher runs without waiting out the interval
+taxi_batch_wakeup = asyncio.Event()
+taxi_batch_state = {"runs": 0, "last_run_at": None, "last_run_ms": None, "searching": 0,
+                    "groups_matched": 0, "riders_matched": 0, "claim_conflicts": 0, "lease_skips": 0}
+
+async def claim_taxi_bookings(booking_ids: List[str]) -> Optional[str]:
+    """Move every booking from searching to matching under one claim id, or none of them.
+    The claim id is also the id of the group's trip"""
+    claim_id = str(uuid.uuid4())
+    result = await taxi_bookings_collection.update_many(
+        {"id": {"$in": booking_ids}, "status": "searching"},
+        {"$set": {"status": "matching", "claim_id": claim_id, "claimed_at": datetime.utcnow()}}
     )
+    if result.modified_count == len(booking_ids):
+        return claim_id
     
-    return trip_id
+    # Someone cancelled or matched part of the group meanwhile
+    await release_taxi_booking_claim(claim_id)
+    return None
 
-def calculate_shared_cost(origin: Location, destination: Location, rider_count: int) -> float:
-    """Calculate cost per person for shared taxi"""
+async def release_taxi_booking_claim(claim_id: str):
+    await taxi_bookings_collection.update_many(
+        {"claim_id": claim_id, "status": "matching"},
+        {"$set": {"status": "searching"}, "$unset": {"claim_id": "", "claimed_at": ""}}
+    )
+
+async def complete_taxi_booking_claim(claim_id: str, riders: List[tuple]) -> int:
+    """Mark the claimed (booking id, user id) riders matched to the trip with the claim's id"""
+    result = await taxi_bookings_collection.bulk_write([
+        UpdateOne(
+            {"id": booking_id, "claim_id": claim_id, "status": "matching"},
+            {
+                "$set": {
+                    "status": "matched",
+                    "trip_id": claim_id,
+                    "matched_riders": [other for _, other in riders if other != user_id]
+                },
+                "$unset": {"claim_id": "", "claimed_at": ""}
+            }
+        )
+        for booking_id, user_id in riders
+    ], ordered=False)
+    return result.modified_count
+
+async def settle_taxi_booking_claim(claim_id: str) -> bool:
+    """Finish a claim whose matching stopped part way: inserting the trip is the commit
+    point, so the riders are matched if it exists and searching again otherwise"""
+    trip = await trips_collection.find_one({"id": claim_id}, {"_id": 0, "riders": 1})
+    if trip is None:
+        await release_taxi_booking_claim(claim_id)
+        return False
+    await complete_taxi_booking_claim(claim_id, [(rider["booking_id"], rider["user_id"]) for rider in trip["riders"]])
+    return True
+
+async def match_taxi_group(group: List[dict], claim_id: str) -> str:
+    """Create the shared trip for a claimed group and notify every rider"""
+    primary = group[0]  # earliest pickup
+    booking_data = TaxiBookingRequest(
+        origin=primary["origin"],
+        destination=primary["destination"],
+        pickup_time=primary["pickup_time"],
+        notes=primary.get("notes") or "",
+        max_waiting_time=primary.get("max_waiting_time", 7)
+    )
+    price_per_person = fare(
+        await resolve_route_distance_km(booking_data.origin, booking_data.destination),
+        len(group)
+    )
+    # The trip takes the claim's id, so a failure from here on can tell whether it exists
+    trip_id = await create_shared_taxi_trip(
+        claim_id, booking_data, {"id": primary["user_id"], "name": primary["user_name"], "booking_id": primary["id"]},
+        group[1:], price_per_person
+    )
     
-    try:
-        # Use Google Maps to get distance
-        directions_result = gmaps.directions(
-            origin.coordinates,
-            destination.coordinates,
-            mode="driving"
+    matched = await complete_taxi_booking_claim(trip_id, [(booking["id"], booking["user_id"]) for booking in group])
+    if not matched and not await taxi_bookings_collection.find_one({"id": primary["id"], "trip_id": trip_id}, {"_id": 1}):
+        # The claim timed out and went back to searching meanwhile; the trip is not used
+        await trips_collection.delete_one({"id": trip_id})
+        raise RuntimeError(f"Claim {claim_id} expired before its riders were matched")
+    
+    for booking in group:
+        others = [other["user_name"] for other in group if other is not booking]
+        await manager.send_personal_message(
+            json.dumps({
+                "type": "taxi_match_found",
+                "trip_id": trip_id,
+                "booking_id": booking["id"],
+                "message": f"Taxi sharing match found! {' and '.join(others)} {'is' if len(others) == 1 else 'are'} going your direction.",
+                "pickup_time": booking_data.pickup_time.isoformat(),
+                "riders_count": len(group),
+                "estimated_cost": price_per_person
+            }),
+            booking["user_id"]
         )
+    return trip_id
+
+async def run_taxi_batch_matching():
+    """One matching pass over every open request with a pickup still ahead"""
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    
+    # Claims left behind by a pass that died mid-way
+    stale = await taxi_bookings_collection.find(
+        {"status": "matching", "claimed_at": {"$lt": now - timedelta(seconds=TAXI_BATCH_CLAIM_TIMEOUT_SECONDS)}},
+        {"_id": 0, "claim_id": 1}
+    ).to_list(length=None)
+    for claim_id in {booking["claim_id"] for booking in stale}:
+        await settle_taxi_booking_claim(claim_id)
+    
+    bookings = await taxi_bookings_collection.find(
+        {"status": "searching", "pickup_time": {"$gte": now}}, TAXI_BATCH_PROJECTION
+    ).to_list(length=None)
+    # Legacy requests with malformed locations can never match
+    bookings = [
+        booking for booking in bookings
+        if isinstance((booking.get("origin") or {}).get("coordinates"), dict)
+        and isinstance((booking.get("destination") or {}).get("coordinates"), dict)
+    ]
+    
+    # Grouping is CPU-bound; keep the event loop serving requests meanwhile
+    groups = await asyncio.to_thread(ride_matching.group_bookings, bookings) if len(bookings) > 1 else []
+    
+    for group in groups:
+        claim_id = await claim_taxi_bookings([booking["id"] for booking in group])
+        if claim_id is None:
+            taxi_batch_state["claim_conflicts"] += 1
+            continue
+        try:
+            await match_taxi_group(group, claim_id)
+        except Exception as e:
+            print(f"Error matching taxi group: {e}")
+            if not await settle_taxi_booking_claim(claim_id):
+                continue
+        taxi_batch_state["groups_matched"] += 1
+        taxi_batch_state["riders_matched"] += len(group)
+    
+    taxi_batch_state["runs"] += 1
+    taxi_batch_state["last_run_at"] = now
+    taxi_batch_state["last_run_ms"] = (time.perf_counter() - started) * 1000
+    taxi_batch_state["searching"] = len(bookings)
+
+async def run_taxi_batch_matcher():
+    while True:
+        taxi_batch_wakeup.clear()
+        try:
+            # A pass still running after the claim timeout is treated as dead, as its claims are
+            if await acquire_job_lease(TAXI_BATCH_LEASE_ID, TAXI_BATCH_CLAIM_TIMEOUT_SECONDS):
+                try:
+                    await run_taxi_batch_matching()
+                finally:
+                    # Held for the minimum interval, so no worker starts the next pass sooner
+                    await release_job_lease(TAXI_BATCH_LEASE_ID, TAXI_BATCH_MIN_INTERVAL_SECONDS)
+            else:
+                taxi_batch_state["lease_skips"] += 1
+        except Exception as e:
+            print(f"Error in taxi batch matcher: {e}")
+        # Requests arriving meanwhile share the next pass instead of each starting one
+        await asyncio.sleep(TAXI_BATCH_MIN_INTERVAL_SECONDS)
+        try:
+            await asyncio.wait_for(taxi_batch_wakeup.wait(),
+                                   max(0.0, TAXI_BATCH_INTERVAL_SECONDS - TAXI_BATCH_MIN_INTERVAL_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+
+@app.on_event("startup")
+async def start_taxi_batch_matcher():
+    start_background_task(run_taxi_batch_matcher())
+
+# Airport travel-time table: distance and hour-of-week travel time between a grid
+# of home cells and each airport, built in the background so airport routes,
+# fares and ETAs are answered in O(1) without a routing call
+AIRPORT_TABLE_AIRPORTS = ("IST", "SAW")  # zone ids in fare_corridors.json
+AIRPORT_TABLE_BOUNDS = {"min_lat": 40.80, "max_lat": 41.35, "min_lng": 28.45, "max_lng": 29.45}
+AIRPORT_TABLE_CELL_DEGREES = float(os.environ.get('AIRPORT_TABLE_CELL_DEGREES', '0.02'))  # ~2 km
+AIRPORT_TABLE_REFRESH_SECONDS = float(os.environ.get('AIRPORT_TABLE_REFRESH_SECONDS', '86400'))
+# Rebuild sooner when Google was unavailable and cells fell back to local estimates
+AIRPORT_TABLE_RETRY_SECONDS = float(os.environ.get('AIRPORT_TABLE_RETRY_SECONDS', '3600'))
+AIRPORT_TABLE_BATCH_SIZE = 25  # origins per distance matrix request
+# One worker builds the table under this lease; the others reload what it saved
+AIRPORT_TABLE_LEASE_ID = "airport_travel_table"
+AIRPORT_TABLE_BUILD_TIMEOUT_SECONDS = 1800  # a build still running after this is treated as dead
+AIRPORT_TABLE_RELOAD_SECONDS = float(os.environ.get('AIRPORT_TABLE_RELOAD_SECONDS', '600'))
+
+airport_travel_times_collection = db.airport_travel_times
+# (cell, airport id) -> {"distance_km", "durations": minutes for each hour of week}
+airport_travel_table: Dict[tuple, dict] = {}
+airport_travel_table_state = {"built_at": None, "estimated": 0, "hits": 0, "misses": 0}
+
+def airport_table_cell(coordinates: dict) -> Optional[tuple]:
+    bounds = AIRPORT_TABLE_BOUNDS
+    if not (bounds["min_lat"] <= coordinates["lat"] < bounds["max_lat"]
+            and bounds["min_lng"] <= coordinates["lng"] < bounds["max_lng"]):
+        return None
+    return (
+        int((coordinates["lat"] - bounds["min_lat"]) // AIRPORT_TABLE_CELL_DEGREES),
+        int((coordinates["lng"] - bounds["min_lng"]) // AIRPORT_TABLE_CELL_DEGREES)
+    )
+
+def airport_table_cell_center(cell: tuple) -> dict:
+    return {
+        "lat": AIRPORT_TABLE_BOUNDS["min_lat"] + (cell[0] + 0.5) * AIRPORT_TABLE_CELL_DEGREES,
+        "lng": AIRPORT_TABLE_BOUNDS["min_lng"] + (cell[1] + 0.5) * AIRPORT_TABLE_CELL_DEGREES
+    }
+
+def airport_zone_containing(coordinates: dict) -> Optional[str]:
+    for airport_id in AIRPORT_TABLE_AIRPORTS:
+        zone = fare_corridor_zones.get(airport_id)
+        if zone and calculate_distance_between_points(coordinates, zone["center"]) <= zone["radius_km"]:
+            return airport_id
+    return None
+
+def lookup_airport_travel_time(origin_coords: dict, destination_coords: dict,
+                               departure_time: Optional[datetime] = None) -> Optional[dict]:
+    """Tabled distance and travel time when one end is an airport; travel times are taken as symmetric"""
+    airport_id, home_coords = airport_zone_containing(destination_coords), origin_coords
+    if airport_id is None:
+        airport_id, home_coords = airport_zone_containing(origin_coords), destination_coords
+    if airport_id is None:
+        return None
+    
+    cell = airport_table_cell(home_coords)
+    entry = airport_travel_table.get((cell, airport_id)) if cell else None
+    if entry is None:
+        airport_travel_table_state["misses"] += 1
+        return None
+    
+    airport_travel_table_state["hits"] += 1
+    return {
+        "distance_km": entry["distance_km"],
+        "duration_minutes": entry["durations"][local_routing.hour_of_week(departure_time)],
+        "estimated": entry["estimated"]
+    }
+
+async def build_airport_travel_table() -> Dict[tuple, dict]:
+    """Route every grid cell centre to each airport once, then spread the time over the week"""
+    rows = int(round((AIRPORT_TABLE_BOUNDS["max_lat"] - AIRPORT_TABLE_BOUNDS["min_lat"]) / AIRPORT_TABLE_CELL_DEGREES))
+    columns = int(round((AIRPORT_TABLE_BOUNDS["max_lng"] - AIRPORT_TABLE_BOUNDS["min_lng"]) / AIRPORT_TABLE_CELL_DEGREES))
+    cells = [(row, column) for row in range(rows) for column in range(columns)]
+    
+    # Google's matrix is requested without a departure time, so its duration is a
+    # typical one whatever the hour the build runs; it is taken at the profile's
+    # mean speed and scaled to every hour of the week by the local speed profile
+    week_speeds = local_routing.hour_of_week_speeds()
+    reference_speed = sum(week_speeds) / len(week_speeds)
+    
+    table = {}
+    for airport_id in AIRPORT_TABLE_AIRPORTS:
+        airport_coords = fare_corridor_zones[airport_id]["center"]
+        for start in range(0, len(cells), AIRPORT_TABLE_BATCH_SIZE):
+            batch = cells[start:start + AIRPORT_TABLE_BATCH_SIZE]
+            matrix = await routing_provider.distance_matrix(
+                origins=[airport_table_cell_center(cell) for cell in batch],
+                destinations=[airport_coords]
+            )
+            for cell, row in zip(batch, matrix):
+                element = row[0]
+                if element is None:  # water or otherwise unroutable
+                    continue
+                if element["estimated"]:
+                    # Local fallback: the speed profile gives each hour's time directly
+                    durations = [element["distance_km"] / speed * 60 for speed in week_speeds]
+                else:
+                    durations = [element["duration_minutes"] * reference_speed / speed for speed in week_speeds]
+                table[(cell, airport_id)] = {
+                    "distance_km": round(element["distance_km"], 2),
+                    "durations": [round(duration, 1) for duration in durations],
+                    "estimated": element["estimated"]
+                }
+    return table
+
+async def save_airport_travel_table(table: Dict[tuple, dict], built_at: datetime):
+    """Persist the routed entries; local estimates are rebuilt rather than restored as real routes"""
+    operations = [
+        ReplaceOne(
+            {"_id": f"{airport_id}:{cell[0]}:{cell[1]}"},
+            {"cell": list(cell), "airport": airport_id, "cell_degrees": AIRPORT_TABLE_CELL_DEGREES,
+             "built_at": built_at, **entry},
+            upsert=True
+        )
+        for (cell, airport_id), entry in table.items()
+        if not entry["estimated"]
+    ]
+    for start in range(0, len(operations), 1000):
+        await airport_travel_times_collection.bulk_write(operations[start:start + 1000], ordered=False)
+    # Cells only estimated this time keep their last routed entry
+    estimated_ids = [f"{airport_id}:{cell[0]}:{cell[1]}" for (cell, airport_id), entry in table.items() if entry["estimated"]]
+    await airport_travel_times_collection.delete_many({"built_at": {"$lt": built_at}, "_id": {"$nin": estimated_ids}})
+
+async def load_airport_travel_table():
+    """Restore the last built table so a restart does not trigger a rebuild"""
+    entries = await airport_travel_times_collection.find(
+        {"cell_degrees": AIRPORT_TABLE_CELL_DEGREES}
+    ).to_list(length=None)
+    if not entries:
+        return
+    
+    airport_travel_table.clear()
+    airport_travel_table.update({
+        (tuple(entry["cell"]), entry["airport"]): {"distance_km": entry["distance_km"], "durations": entry["durations"],
+                                                   "estimated": False}
+        for entry in entries
+        if len(entry["durations"]) == HOURS_PER_WEEK
+    })
+    airport_travel_table_state["built_at"] = min(entry["built_at"] for entry in entries)
+
+async def refresh_airport_travel_table():
+    built_at = datetime.utcnow()
+    table = await build_airport_travel_table()
+    # Swap in the complete table at once so lookups never see a partial build
+    airport_travel_table.clear()
+    airport_travel_table.update(table)
+    airport_travel_table_state["built_at"] = built_at
+    airport_travel_table_state["estimated"] = sum(1 for entry in table.values() if entry["estimated"])
+    await save_airport_travel_table(table, built_at)
+    print(f"Airport travel-time table built: {len(table)} cells, {airport_travel_table_state['estimated']} estimated")
+
+def airport_table_refresh_seconds() -> float:
+    if airport_travel_table_state["estimated"] and routing_provider is not local_routing:
+        return AIRPORT_TABLE_RETRY_SECONDS
+    return AIRPORT_TABLE_REFRESH_SECONDS
+
+async def run_airport_travel_table():
+    try:
+        await load_airport_travel_table()
+    except Exception as e:
+        print(f"Error loading airport travel-time table: {e}")
+    
+    while True:
+        built_at = airport_travel_table_state["built_at"]
+        age = (datetime.utcnow() - built_at).total_seconds() if built_at else None
+        if age is not None and age < airport_table_refresh_seconds():
+            await asyncio.sleep(max(60, airport_table_refresh_seconds() - age))
+            continue
         
-        if directions_result:
-            distance_km = directions_result[0]['legs'][0]['distance']['value'] / 1000
-            
-            # Base taxi fare calculation (Istanbul rates)
-            base_fare = 5.0  # Base fare
-            per_km_rate = 3.5  # Per km rate
-            total_cost = base_fare + (distance_km * per_km_rate)
-            
-            # Split among riders
-            cost_per_person = total_cost / rider_count
-            
-            return round(cost_per_person, 2)
+        if await acquire_job_lease(AIRPORT_TABLE_LEASE_ID, AIRPORT_TABLE_BUILD_TIMEOUT_SECONDS):
+            try:
+                await refresh_airport_travel_table()
+                hold_seconds = airport_table_refresh_seconds()
+            except Exception as e:
+                print(f"Error building airport travel-time table: {e}")
+                hold_seconds = AIRPORT_TABLE_RETRY_SECONDS
+            # Other workers reload this build rather than rebuilding until it is due
+            await release_job_lease(AIRPORT_TABLE_LEASE_ID, hold_seconds)
+            await asyncio.sleep(max(60, hold_seconds))
+            continue
         
-    except Exception as e:
-        print(f"Error calculating cost: {e}")
+        # Another worker builds the table; pick up what it saved
+        try:
+            await load_airport_travel_table()
+        except Exception as e:
+            print(f"Error loading airport travel-time table: {e}")
+        await asyncio.sleep(AIRPORT_TABLE_RELOAD_SECONDS)
+
+@app.on_event("startup")
+async def start_airport_travel_table():
+    start_background_task(run_airport_travel_table())
+
+# Taxi fare engine (Istanbul rates)
+TAXI_BASE_FARE = 5.0
+TAXI_PER_KM_RATE = 3.5
+TAXI_FALLBACK_FARE = 25.0  # flat rate when the route distance is unknown
+
+def fare(distance_km: Optional[float], riders: int) -> float:
+    """Per-person taxi fare for a route distance split between riders"""
+    if not distance_km:
+        return TAXI_FALLBACK_FARE / riders
+    
+    total_cost = TAXI_BASE_FARE + (distance_km * TAXI_PER_KM_RATE)
+    return round(total_cost / riders, 2)
+
+def lookup_fare_corridor(origin_coords: dict, destination_coords: dict) -> Optional[float]:
+    """Precomputed road distance if both ends fall in a known corridor's zones"""
+    def zones_containing(coords):
+        return {
+            zone_id for zone_id, zone in fare_corridor_zones.items()
+            if calculate_distance_between_points(coords, zone["center"]) <= zone["radius_km"]
+        }
+    
+    origin_zones = zones_containing(origin_coords)
+    if not origin_zones:
+        return None
     
-    # Fallback flat rate
-    return 25.0 / rider_count
+    for destination_zone in zones_containing(destination_coords):
+        for origin_zone in origin_zones:
+            distance_km = fare_corridor_distances.get((origin_zone, destination_zone))
+            if distance_km is not None:
+                return distance_km
+    return None
+
+async def resolve_route_distance_km(origin: Location, destination: Location) -> Optional[float]:
+    """Driving distance from the corridor table, else the airport table or the cached route lookup"""
+    corridor_km = lookup_fare_corridor(origin.coordinates, destination.coordinates)
+    if corridor_km is not None:
+        return corridor_km
+    
+    # calculate_trip_route reads the airport travel-time table, then route_cache per snapped coordinate pair
+    distance_km = (await calculate_trip_route(origin, destination, with_polyline=False)).get("distance_km")
+    return distance_km or None
+
+async def calculate_shared_cost(origin: Location, destination: Location, rider_count: int) -> float:
+    """Calculate cost per person for shared taxi"""
+    return fare(await resolve_route_distance_km(origin, destination), rider_count)
 
 @app.get("/api/wallet/transactions")
 async def get_wallet_transactions(current_user: dict = Depends(get_current_user)):
     """Get user's wallet transaction history"""
-    transactions = list(payment_transactions_collection.find({"user_id": current_user["id"]}).sort("created_at", -1))
+    transactions = await payment_transactions_collection.find({"user_id": current_user["id"]}).sort("created_at", -1).to_list(length=None)
     
     transaction_list = []
     for transaction in transactions:
@@ -818,7 +1759,7 @@ async def get_wallet_transactions(current_user: dict = Depends(get_current_user)
 async def get_booking_status(booking_id: str, current_user: dict = Depends(get_current_user)):
     """Get status of a taxi booking request"""
     
-    booking = db.taxi_bookings.find_one({
+    booking = await taxi_bookings_collection.find_one({
         "id": booking_id,
         "user_id": current_user["id"]
     })
@@ -842,9 +1783,9 @@ async def get_booking_status(booking_id: str, current_user: dict = Depends(get_c
 async def get_my_taxi_bookings(current_user: dict = Depends(get_current_user)):
     """Get all taxi bookings for current user"""
     
-    bookings = list(db.taxi_bookings.find({
+    bookings = await taxi_bookings_collection.find({
         "user_id": current_user["id"]
-    }).sort("created_at", -1))
+    }).sort("created_at", -1).to_list(length=None)
     
     booking_list = []
     for booking in bookings:
@@ -863,17 +1804,17 @@ async def get_my_taxi_bookings(current_user: dict = Depends(get_current_user)):
 @app.post("/api/wallet/pay")
 async def pay_with_wallet(request: WalletPaymentRequest, current_user: dict = Depends(get_current_user)):
     """Make a payment using wallet balance"""
-    wallet = get_or_create_wallet(current_user["id"])
+    wallet = await get_or_create_wallet(current_user["id"])
     
     if wallet["balance"] < request.amount:
         raise HTTPException(status_code=400, detail="Insufficient wallet balance")
     
     try:
         # Update wallet balance
-        update_wallet_balance(current_user["id"], request.amount, "payment")
+        await update_wallet_balance(current_user["id"], request.amount, "payment")
         
         # Create transaction record
-        transaction_id = create_wallet_transaction(
+        transaction_id = await create_wallet_transaction(
             user_id=current_user["id"],
             transaction_type="payment",
             amount=request.amount,
@@ -911,7 +1852,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                     "speed": message_data.get("speed"),
                     "timestamp": datetime.utcnow()
                 }
-                live_tracking_collection.replace_one(
+                await live_tracking_collection.replace_one(
                     {"trip_id": message_data["trip_id"], "user_id": user_id},
                     location_update,
                     upsert=True
@@ -932,7 +1873,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             
             elif message_data["type"] == "chat_message":
                 # Handle chat messages
-                user = users_collection.find_one({"id": user_id})
+                user = await get_user_by_id(user_id)
                 message = {
                     "id": str(uuid.uuid4()),
                     "trip_id": message_data["trip_id"],
@@ -942,7 +1883,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                     "message_type": message_data.get("message_type", "text"),
                     "timestamp": datetime.utcnow()
                 }
-                messages_collection.insert_one(message)
+                await messages_collection.insert_one(message)
                 
                 # Broadcast to trip participants
                 await manager.broadcast_to_trip(
@@ -966,10 +1907,10 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
 @app.post("/api/auth/register")
 async def register(user_data: UserCreate):
     # Check if user already exists
-    if users_collection.find_one({"email": user_data.email}):
+    if await users_collection.find_one({"email": user_data.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if users_collection.find_one({"employee_id": user_data.employee_id}):
+    if await users_collection.find_one({"employee_id": user_data.employee_id}):
         raise HTTPException(status_code=400, detail="Employee ID already registered")
     
     # Create new user
@@ -986,10 +1927,10 @@ async def register(user_data: UserCreate):
         "created_at": datetime.utcnow()
     }
     
-    users_collection.insert_one(user)
+    await users_collection.insert_one(user)
     
     # Initialize wallet with 0 balance
-    get_or_create_wallet(user_id)
+    await get_or_create_wallet(user_id)
     
     # Create JWT token
     token = create_jwt_token(user_id)
@@ -1010,7 +1951,7 @@ async def register(user_data: UserCreate):
 
 @app.post("/api/auth/login")
 async def login(login_data: UserLogin):
-    user = users_collection.find_one({"email": login_data.email})
+    user = await users_collection.find_one({"email": login_data.email})
     
     if not user or not verify_password(login_data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -1054,16 +1995,18 @@ async def update_user_profile(profile_data: UserProfile, current_user: dict = De
         "home_address": profile_data.home_address.dict() if profile_data.home_address else None
     }
     
-    users_collection.update_one(
+    await users_collection.update_one(
         {"id": current_user["id"]},
         {"$set": update_data}
     )
+    user_cache.invalidate(current_user["id"])
     
     return {"message": "Profile updated successfully"}
 
 @app.get("/api/trips/airport")
-async def get_airport_trips(current_user: dict = Depends(get_current_user)):
+async def get_airport_trips(view: str = "summary", current_user: dict = Depends(get_current_user)):
     """Get trips to/from airport, prioritizing those near user's home"""
+    projection = trip_list_projection(view)
     
     # Common airport locations in Turkey
     airport_keywords = ["airport", "havalimanı", "havaalanı", "istanbul airport", "sabiha gökçen", "atatürk airport"]
@@ -1075,64 +2018,51 @@ async def get_airport_trips(current_user: dict = Depends(get_current_user)):
             {"destination.address": {"$regex": "|".join(airport_keywords), "$options": "i"}}
         ],
         "departure_time": {"$gte": datetime.utcnow()},
-        "available_seats": {"$gt": 0}
+        # available_seats is the capacity; only trips with a seat left are bookable
+        "seats_remaining": {"$gt": 0}
     }
     
-    airport_trips = list(trips_collection.find(airport_query))
-    personal_car_trips = list(personal_car_trips_collection.find(airport_query))
+    airport_trips = await trips_collection.find(airport_query, projection).to_list(length=None)
+    
+    # Distance from the user's home to every trip origin in one vectorized pass
+    home_coords = (current_user.get("home_address") or {}).get("coordinates")
+    distances_from_home = [float('inf')] * len(airport_trips)
+    if home_coords:
+        origin_coords = []
+        for trip in airport_trips:
+            origin = trip.get("origin")
+            coordinates = origin.get("coordinates") if isinstance(origin, dict) else None
+            origin_coords.append(coordinates or {"lat": float('nan'), "lng": float('nan')})
+        distances = geo.haversine_pairwise_km(home_coords["lat"], home_coords["lng"], *geo.coordinate_arrays(origin_coords))
+        # NaN (no origin coordinates) ranks last
+        distances_from_home = [distance if distance == distance else float('inf') for distance in distances.tolist()]
     
-    # Combine and process trips
     all_trips = []
-    
-    # Process regular trips
-    for trip in airport_trips:
+    for trip, distance_from_home in zip(airport_trips, distances_from_home):
         trip_data = dict(trip)
-        trip_data["trip_type"] = "taxi"
-        trip_data["max_riders"] = 3
-        trip_data["is_creator"] = trip["creator_id"] == current_user["id"]
-        
-        # Calculate distance from user home if available
-        if current_user.get("home_address") and trip.get("origin"):
-            try:
-                user_coords = current_user["home_address"]["coordinates"]
-                trip_coords = trip["origin"]["coordinates"]
-                
-                # Simple distance calculation (haversine would be more accurate)
-                lat_diff = abs(user_coords["lat"] - trip_coords["lat"])
-                lng_diff = abs(user_coords["lng"] - trip_coords["lng"])
-                approximate_distance = ((lat_diff ** 2 + lng_diff ** 2) ** 0.5) * 111  # Rough km conversion
-                
-                trip_data["distance_from_home"] = approximate_distance
-            except:
-                trip_data["distance_from_home"] = float('inf')
+        if trip.get("trip_type") == "personal_car":
+            trip_data["max_riders"] = trip["available_seats"] + 1
         else:
-            trip_data["distance_from_home"] = float('inf')
-        
-        all_trips.append(trip_data)
-    
-    # Process personal car trips
-    for trip in personal_car_trips:
-        trip_data = dict(trip)
-        trip_data["trip_type"] = "personal_car"
-        trip_data["max_riders"] = trip["available_seats"] + 1
+            trip_data["trip_type"] = "taxi"
+            trip_data["max_riders"] = 3
+        # Seats left to book, as the other trip listings report them
+        trip_data["available_seats"] = trip["seats_remaining"]
+        trip_data["route_polyline"] = list_route_polyline(trip.get("route_polyline"))
         trip_data["is_creator"] = trip["creator_id"] == current_user["id"]
         
-        # Calculate distance from user home
-        if current_user.get("home_address") and trip.get("origin"):
+        trip_data["distance_from_home"] = distance_from_home
+        
+        # Travel time between the user's home and the trip's airport at departure
+        if distance_from_home != float('inf'):
             try:
-                user_coords = current_user["home_address"]["coordinates"]
-                trip_coords = trip["origin"]["coordinates"]
-                
-                lat_diff = abs(user_coords["lat"] - trip_coords["lat"])
-                lng_diff = abs(user_coords["lng"] - trip_coords["lng"])
-                approximate_distance = ((lat_diff ** 2 + lng_diff ** 2) ** 0.5) * 111
-                
-                trip_data["distance_from_home"] = approximate_distance
-            except:
-                trip_data["distance_from_home"] = float('inf')
-        else:
-            trip_data["distance_from_home"] = float('inf')
-            
+                home_eta = lookup_airport_travel_time(home_coords, trip["origin"]["coordinates"], trip["departure_time"])
+                if home_eta is None and trip.get("destination"):
+                    home_eta = lookup_airport_travel_time(home_coords, trip["destination"]["coordinates"], trip["departure_time"])
+                if home_eta:
+                    trip_data["home_eta_minutes"] = home_eta["duration_minutes"]
+            except (KeyError, TypeError):
+                pass
+        
         all_trips.append(trip_data)
     
     # Sort by distance from home (nearest first)
@@ -1155,16 +2085,20 @@ async def create_trip(trip_data: TripCreate, current_user: dict = Depends(get_cu
     trip_id = str(uuid.uuid4())
     
     # Calculate route information
-    route_info = calculate_trip_route(trip_data.origin, trip_data.destination)
+    route_info = await calculate_trip_route(trip_data.origin, trip_data.destination, trip_data.departure_time)
     
     trip = {
         "id": trip_id,
+        "trip_type": "taxi",
+        "schema_version": TRIP_SCHEMA_VERSION,
         "creator_id": current_user["id"],
         "creator_name": current_user["name"],
         "origin": trip_data.origin.dict(),
         "destination": trip_data.destination.dict(),
         "departure_time": trip_data.departure_time,
         "available_seats": trip_data.available_seats,
+        "booked_count": 0,
+        "seats_remaining": trip_data.available_seats,
         "max_riders": 3,
         "price_per_person": trip_data.price_per_person,
         "notes": trip_data.notes,
@@ -1172,42 +2106,61 @@ async def create_trip(trip_data: TripCreate, current_user: dict = Depends(get_cu
         "created_at": datetime.utcnow(),
         "distance_km": route_info.get("distance_km", 0),
         "duration_minutes": route_info.get("duration_minutes", 0),
+        "route_estimated": route_info["estimated"],
         "route_polyline": route_info.get("route_polyline", "")
     }
     
-    trips_collection.insert_one(trip)
+    await trips_collection.insert_one(trip)
     
     return {"message": "Trip created successfully", "trip_id": trip_id}
 
-def find_nearest_bus_stops(location: Location, max_distance_km: float = 2.0) -> List[BusStop]:
-    """Find bus stops within specified distance of a location"""
-    if not gmaps:
-        return []
-    
+async def find_nearest_bus_stops(location: Location, max_distance_km: float = 2.0) -> List[BusStop]:
+    """Find bus stops within specified walking distance of a location"""
     try:
-        # Get all bus stops from database
-        all_bus_stops = list(bus_stops_collection.find())
-        nearby_stops = []
-        
-        for stop in all_bus_stops:
-            # Calculate distance between location and bus stop
-            result = gmaps.distance_matrix(
-                origins=[f"{location.coordinates['lat']},{location.coordinates['lng']}"],
-                destinations=[f"{stop['location']['coordinates']['lat']},{stop['location']['coordinates']['lng']}"],
-                mode="walking",
-                units="metric"
+        # Walking distance is never shorter than the straight line, so the
+        # 2dsphere radius query cannot drop a stop that is within range
+        candidates = await bus_stops_collection.find({
+            "geo": {
+                "$nearSphere": {
+                    "$geometry": geojson_point(location.coordinates),
+                    "$maxDistance": max_distance_km * 1000
+                }
+            }
+        }).limit(BUS_STOP_CANDIDATE_LIMIT).to_list(length=None)
+        
+        walking_km = {}
+        uncached_stops = []
+        for stop in candidates:
+            cached_distance = await walking_cache.get(walking_cache_key(location.coordinates, stop["id"]))
+            if cached_distance is MISSING:
+                uncached_stops.append(stop)
+            else:
+                walking_km[stop["id"]] = cached_distance
+        
+        # One distance matrix request for every stop not already cached
+        if uncached_stops:
+            matrix = await routing_provider.distance_matrix(
+                origins=[location.coordinates],
+                destinations=[stop["location"]["coordinates"] for stop in uncached_stops],
+                mode="walking"
             )
-            
-            if result["rows"][0]["elements"][0]["status"] == "OK":
-                distance_km = result["rows"][0]["elements"][0]["distance"]["value"] / 1000
-                if distance_km <= max_distance_km:
-                    stop_obj = BusStop(
-                        id=stop["id"],
-                        name=stop["name"],
-                        location=Location(**stop["location"]),
-                        description=stop.get("description")
-                    )
-                    nearby_stops.append((distance_km, stop_obj))
+            for stop, element in zip(uncached_stops, matrix[0]):
+                distance_km = element["distance_km"] if element else None
+                if not (element and element["estimated"]):
+                    await walking_cache.set(walking_cache_key(location.coordinates, stop["id"]), distance_km)
+                walking_km[stop["id"]] = distance_km
+        
+        nearby_stops = []
+        for stop in candidates:
+            distance_km = walking_km.get(stop["id"])
+            if distance_km is not None and distance_km <= max_distance_km:
+                stop_obj = BusStop(
+                    id=stop["id"],
+                    name=stop["name"],
+                    location=Location(**stop["location"]),
+                    description=stop.get("description")
+                )
+                nearby_stops.append((distance_km, stop_obj))
         
         # Sort by distance and return bus stop objects
         nearby_stops.sort(key=lambda x: x[0])
@@ -1216,85 +2169,176 @@ def find_nearest_bus_stops(location: Location, max_distance_km: float = 2.0) ->
         print(f"Error finding nearest bus stops: {e}")
         return []
 
+async def count_riders_by_trip(collection, trip_ids: List[str], status: str) -> Dict[str, int]:
+    """Count documents with the given status per trip in a single aggregation"""
+    if not trip_ids:
+        return {}
+    
+    pipeline = [
+        {"$match": {"trip_id": {"$in": trip_ids}, "status": status}},
+        {"$group": {"_id": "$trip_id", "count": {"$sum": 1}}}
+    ]
+    counts = await collection.aggregate(pipeline).to_list(length=None)
+    return {row["_id"]: row["count"] for row in counts}
+
+async def reserve_trip_seat(trip_id: str) -> bool:
+    """Atomically take one seat on a trip; returns False if it is already full"""
+    result = await trips_collection.update_one(
+        {"id": trip_id, "seats_remaining": {"$gt": 0}},
+        {"$inc": {"booked_count": 1, "seats_remaining": -1}}
+    )
+    return result.modified_count == 1
+
+async def release_trip_seat(trip_id: str):
+    """Give back a seat taken with reserve_trip_seat"""
+    await trips_collection.update_one(
+        {"id": trip_id, "booked_count": {"$gt": 0}},
+        {"$inc": {"booked_count": -1, "seats_remaining": 1}}
+    )
+
+async def backfill_seat_counters():
+    """Initialise booked_count/seats_remaining on trips created before the counters existed"""
+    legacy_trips = await trips_collection.find(
+        {"seats_remaining": {"$exists": False}},
+        {"id": 1, "available_seats": 1, "status": 1}
+    ).to_list(length=None)
+    if not legacy_trips:
+        return
+    
+    # Join requests only exist for personal car trips, so summing both is safe
+    trip_ids = [trip["id"] for trip in legacy_trips]
+    booking_counts = await count_riders_by_trip(bookings_collection, trip_ids, "confirmed")
+    join_counts = await count_riders_by_trip(join_requests_collection, trip_ids, "approved")
+    
+    for trip in legacy_trips:
+        booked_count = booking_counts.get(trip["id"], 0) + join_counts.get(trip["id"], 0)
+        seats_remaining = max(0, trip["available_seats"] - booked_count)
+        if trip.get("status") == "cancelled":
+            booked_count, seats_remaining = 0, 0
+        await trips_collection.update_one(
+            {"id": trip["id"], "seats_remaining": {"$exists": False}},
+            {"$set": {"booked_count": booked_count, "seats_remaining": seats_remaining}}
+        )
+
+@app.on_event("startup")
+async def bootstrap_seat_counters():
+    await backfill_seat_counters()
+
+TRIP_LIST_DEFAULT_LIMIT = 50
+TRIP_LIST_MAX_LIMIT = 200
+TRIP_LIST_SORT = [("departure_time", ASCENDING), ("id", ASCENDING)]
+
+def encode_trip_cursor(trip: dict) -> str:
+    """Opaque keyset cursor for the (departure_time, id) sort order"""
+    raw = json.dumps({"t": trip["departure_time"].isoformat(), "id": trip["id"]})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_trip_cursor(cursor: str) -> tuple:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return datetime.fromisoformat(data["t"]), data["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_trip_listing_query(departure_from: datetime, departure_to: Optional[datetime],
+                             after: Optional[tuple], bbox: Optional[Dict[str, float]]) -> dict:
+    """Filter for active trips in a departure window, after a cursor and inside a bounding box"""
+    departure_filter = {"$gte": departure_from}
+    if departure_to:
+        departure_filter["$lte"] = departure_to
+    
+    query = {"status": "active", "departure_time": departure_filter}
+    
+    if after:
+        after_time, after_id = after
+        query["$or"] = [
+            {"departure_time": {"$gt": after_time}},
+            {"departure_time": after_time, "id": {"$gt": after_id}}
+        ]
+    
+    if bbox:
+        query["origin.coordinates.lat"] = {"$gte": bbox["min_lat"], "$lte": bbox["max_lat"]}
+        query["origin.coordinates.lng"] = {"$gte": bbox["min_lng"], "$lte": bbox["max_lng"]}
+    
+    return query
+
 @app.get("/api/trips")
-async def get_available_trips(trip_type: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    """Get available trips - both taxi and personal car"""
-    all_trips = []
+async def get_available_trips(
+    trip_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(TRIP_LIST_DEFAULT_LIMIT, ge=1, le=TRIP_LIST_MAX_LIMIT),
+    departure_from: Optional[datetime] = Query(None, alias="from"),
+    departure_to: Optional[datetime] = Query(None, alias="to"),
+    min_lat: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    min_lng: Optional[float] = None,
+    max_lng: Optional[float] = None,
+    view: str = "summary",
+    current_user: dict = Depends(get_current_user)
+):
+    """Get available trips - both taxi and personal car, keyset-paginated by departure time"""
+    projection = trip_list_projection(view)
+    
+    bbox = None
+    bbox_values = (min_lat, max_lat, min_lng, max_lng)
+    if any(value is not None for value in bbox_values):
+        if any(value is None for value in bbox_values):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, max_lat, min_lng and max_lng")
+        bbox = {"min_lat": min_lat, "max_lat": max_lat, "min_lng": min_lng, "max_lng": max_lng}
+    
+    # Trips that already departed are excluded unless an explicit window asks for them
+    query = build_trip_listing_query(
+        departure_from or datetime.utcnow(),
+        departure_to,
+        decode_trip_cursor(cursor) if cursor else None,
+        bbox
+    )
     
-    # Get taxi trips
-    if not trip_type or trip_type == "taxi":
-        taxi_trips = list(trips_collection.find({"status": "active"}))
-        for trip in taxi_trips:
-            trip["trip_type"] = "taxi"
-        all_trips.extend(taxi_trips)
-    
-    # Get personal car trips
-    if not trip_type or trip_type == "personal_car":
-        personal_trips = list(personal_car_trips_collection.find({"status": "active"}))
-        for trip in personal_trips:
-            trip["trip_type"] = "personal_car"
-        all_trips.extend(personal_trips)
+    if trip_type:
+        query["trip_type"] = trip_type
+    
+    page = await trips_collection.find(query, projection).sort(TRIP_LIST_SORT).limit(limit + 1).to_list(length=None)
+    all_trips = page[:limit]
+    next_cursor = encode_trip_cursor(all_trips[-1]) if len(page) > limit else None
     
     trip_list = []
     for trip in all_trips:
-        # Get bookings/requests for this trip
-        if trip["trip_type"] == "taxi":
-            bookings = list(bookings_collection.find({"trip_id": trip["id"], "status": "confirmed"}))
-            current_riders = len(bookings)
-        else:
-            join_requests = list(join_requests_collection.find({"trip_id": trip["id"], "status": "approved"}))
-            current_riders = len(join_requests)
+        # Seat occupancy is maintained on the trip document itself
+        current_riders = trip.get("booked_count", 0)
         
-        # Handle both old string format and new Location format
-        try:
-            if isinstance(trip["origin"], str):
-                origin = Location(address=trip["origin"], coordinates={"lat": 0, "lng": 0})
-            else:
-                origin = Location(**trip["origin"])
-        except Exception as e:
-            print(f"Error parsing origin: {e}")
-            origin = Location(address=str(trip["origin"]), coordinates={"lat": 0, "lng": 0})
-        
-        try:
-            if isinstance(trip["destination"], str):
-                destination = Location(address=trip["destination"], coordinates={"lat": 0, "lng": 0})
-            else:
-                destination = Location(**trip["destination"])
-        except Exception as e:
-            print(f"Error parsing destination: {e}")
-            destination = Location(address=str(trip["destination"]), coordinates={"lat": 0, "lng": 0})
+        origin = decode_location(trip["origin"])
+        destination = decode_location(trip["destination"])
         
         trip_data = {
             "id": trip["id"],
             "creator_id": trip["creator_id"],
             "creator_name": trip["creator_name"],
-            "trip_type": trip["trip_type"],
+            "trip_type": trip.get("trip_type", "taxi"),
             "origin": origin,
             "destination": destination,
             "departure_time": trip["departure_time"],
-            "available_seats": trip["available_seats"] - current_riders,
+            "available_seats": trip.get("seats_remaining", trip["available_seats"] - current_riders),
             "max_riders": trip.get("max_riders", 3),
             "price_per_person": trip["price_per_person"],
-            "notes": trip.get("notes", ""),
             "status": trip["status"],
             "created_at": trip["created_at"],
             "distance_km": trip.get("distance_km", 0),
             "duration_minutes": trip.get("duration_minutes", 0),
-            "route_polyline": trip.get("route_polyline", ""),
             "current_riders": current_riders,
             "is_creator": trip["creator_id"] == current_user["id"],
             # Personal car specific fields
             "car_model": trip.get("car_model"),
             "car_color": trip.get("car_color"),
             "license_plate": trip.get("license_plate"),
-            "nearest_bus_stop": trip.get("nearest_bus_stop")
+            "nearest_bus_stop": trip.get("nearest_bus_stop"),
+            # Simplified for list maps; GET /api/trips/{trip_id} serves the full route
+            "route_polyline": list_route_polyline(trip.get("route_polyline"))
         }
+        if view == "full":
+            trip_data["notes"] = trip.get("notes", "")
         trip_list.append(trip_data)
     
-    # Sort by departure time
-    trip_list.sort(key=lambda x: x["departure_time"])
-    
-    return {"trips": trip_list}
+    return {"trips": trip_list, "next_cursor": next_cursor}
 
 # Personal car trips (new functionality)
 @app.post("/api/trips/personal-car")
@@ -1302,10 +2346,10 @@ async def create_personal_car_trip(trip_data: PersonalCarTripCreate, current_use
     trip_id = str(uuid.uuid4())
     
     # Calculate route information
-    route_info = calculate_trip_route(trip_data.origin, trip_data.destination)
+    route_info = await calculate_trip_route(trip_data.origin, trip_data.destination, trip_data.departure_time)
     
     # Find nearest bus stops to origin
-    nearest_bus_stops = find_nearest_bus_stops(trip_data.origin)
+    nearest_bus_stops = await find_nearest_bus_stops(trip_data.origin)
     nearest_bus_stop = nearest_bus_stops[0] if nearest_bus_stops else None
     
     trip = {
@@ -1313,10 +2357,13 @@ async def create_personal_car_trip(trip_data: PersonalCarTripCreate, current_use
         "creator_id": current_user["id"],
         "creator_name": current_user["name"],
         "trip_type": "personal_car",
+        "schema_version": TRIP_SCHEMA_VERSION,
         "origin": trip_data.origin.dict(),
         "destination": trip_data.destination.dict(),
         "departure_time": trip_data.departure_time,
         "available_seats": trip_data.available_seats,
+        "booked_count": 0,
+        "seats_remaining": trip_data.available_seats,
         "max_riders": trip_data.available_seats,
         "price_per_person": trip_data.price_per_person,
         "notes": trip_data.notes,
@@ -1324,6 +2371,7 @@ async def create_personal_car_trip(trip_data: PersonalCarTripCreate, current_use
         "created_at": datetime.utcnow(),
         "distance_km": route_info.get("distance_km", 0),
         "duration_minutes": route_info.get("duration_minutes", 0),
+        "route_estimated": route_info["estimated"],
         "route_polyline": route_info.get("route_polyline", ""),
         # Personal car specific fields
         "car_model": trip_data.car_model,
@@ -1332,14 +2380,14 @@ async def create_personal_car_trip(trip_data: PersonalCarTripCreate, current_use
         "nearest_bus_stop": nearest_bus_stop.dict() if nearest_bus_stop else None
     }
     
-    personal_car_trips_collection.insert_one(trip)
+    await trips_collection.insert_one(trip)
     
     return {"message": "Personal car trip created successfully", "trip_id": trip_id}
 
 @app.post("/api/trips/{trip_id}/join-request")
 async def create_join_request(trip_id: str, request_data: JoinRequestCreate, current_user: dict = Depends(get_current_user)):
     """Create a join request for personal car trips"""
-    trip = personal_car_trips_collection.find_one({"id": trip_id})
+    trip = await find_trip(trip_id, "personal_car")
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
@@ -1347,7 +2395,7 @@ async def create_join_request(trip_id: str, request_data: JoinRequestCreate, cur
         raise HTTPException(status_code=400, detail="Cannot request to join your own trip")
     
     # Check if user already has a pending or approved request
-    existing_request = join_requests_collection.find_one({
+    existing_request = await join_requests_collection.find_one({
         "trip_id": trip_id,
         "requester_id": current_user["id"],
         "status": {"$in": ["pending", "approved"]}
@@ -1359,7 +2407,7 @@ async def create_join_request(trip_id: str, request_data: JoinRequestCreate, cur
     # Get bus stop if specified
     pickup_bus_stop = None
     if request_data.pickup_bus_stop_id:
-        bus_stop_data = bus_stops_collection.find_one({"id": request_data.pickup_bus_stop_id})
+        bus_stop_data = await bus_stops_collection.find_one({"id": request_data.pickup_bus_stop_id})
         if bus_stop_data:
             pickup_bus_stop = BusStop(**bus_stop_data)
     
@@ -1376,7 +2424,7 @@ async def create_join_request(trip_id: str, request_data: JoinRequestCreate, cur
         "created_at": datetime.utcnow()
     }
     
-    join_requests_collection.insert_one(join_request)
+    await join_requests_collection.insert_one(join_request)
     
     # Send real-time notification to trip creator
     await manager.send_personal_message(
@@ -1398,22 +2446,35 @@ async def respond_to_join_request(request_id: str, action: str, current_user: di
     if action not in ["approve", "reject"]:
         raise HTTPException(status_code=400, detail="Action must be 'approve' or 'reject'")
     
-    join_request = join_requests_collection.find_one({"id": request_id})
+    join_request = await join_requests_collection.find_one({"id": request_id})
     if not join_request:
         raise HTTPException(status_code=404, detail="Join request not found")
     
     # Verify the current user is the trip creator
-    trip = personal_car_trips_collection.find_one({"id": join_request["trip_id"]})
+    trip = await find_trip(join_request["trip_id"], "personal_car")
     if not trip or trip["creator_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to respond to this request")
     
     # Update request status
     new_status = "approved" if action == "approve" else "rejected"
-    join_requests_collection.update_one(
-        {"id": request_id},
+    
+    # Approving takes a seat on the trip; fail before touching the request if it is full
+    if new_status == "approved" and join_request["status"] != "approved":
+        if not await reserve_trip_seat(join_request["trip_id"]):
+            raise HTTPException(status_code=400, detail="No available seats")
+    
+    result = await join_requests_collection.update_one(
+        {"id": request_id, "status": join_request["status"]},
         {"$set": {"status": new_status, "responded_at": datetime.utcnow()}}
     )
     
+    if new_status == "approved" and join_request["status"] != "approved":
+        if result.modified_count == 0:
+            # A concurrent response already changed this request
+            await release_trip_seat(join_request["trip_id"])
+    elif join_request["status"] == "approved" and result.modified_count == 1:
+        await release_trip_seat(join_request["trip_id"])
+    
     # Send notification to requester
     await manager.send_personal_message(
         json.dumps({
@@ -1433,7 +2494,7 @@ async def get_trip_messages(trip_id: str, current_user: dict = Depends(get_curre
     if current_user["id"] not in participants:
         raise HTTPException(status_code=403, detail="Not authorized to view messages for this trip")
     
-    messages = list(messages_collection.find({"trip_id": trip_id}).sort("timestamp", 1))
+    messages = await messages_collection.find({"trip_id": trip_id}).sort("timestamp", 1).to_list(length=None)
     
     message_list = []
     for msg in messages:
@@ -1456,11 +2517,13 @@ async def get_live_tracking(trip_id: str, current_user: dict = Depends(get_curre
     if current_user["id"] not in participants:
         raise HTTPException(status_code=403, detail="Not authorized to view tracking for this trip")
     
-    tracking_data = list(live_tracking_collection.find({"trip_id": trip_id}))
+    tracking_data = await live_tracking_collection.find({"trip_id": trip_id}).to_list(length=None)
+    
+    users = await get_users_by_ids([location["user_id"] for location in tracking_data])
     
     locations = []
     for location in tracking_data:
-        user = users_collection.find_one({"id": location["user_id"]})
+        user = users.get(location["user_id"])
         locations.append({
             "user_id": location["user_id"],
             "user_name": user["name"] if user else "Unknown",
@@ -1480,7 +2543,7 @@ async def initiate_call(call_request: CallRequest, current_user: dict = Depends(
         raise HTTPException(status_code=500, detail="Calling service not available")
     
     # Get the target user's phone number
-    target_user = users_collection.find_one({"id": call_request.to_user_id})
+    target_user = await users_collection.find_one({"id": call_request.to_user_id})
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -1520,21 +2583,41 @@ async def get_nearby_bus_stops(lat: float, lng: float, radius_km: float = 2):
         coordinates={"lat": lat, "lng": lng}
     )
     
-    bus_stops = find_nearest_bus_stops(location, radius_km)
+    bus_stops = await find_nearest_bus_stops(location, radius_km)
     return {"bus_stops": [stop.dict() for stop in bus_stops]}
 
+@app.get("/api/trips/{trip_id}/pickup-preview")
+async def preview_trip_pickup(
+    trip_id: str,
+    lat: float,
+    lng: float,
+    current_user: dict = Depends(get_current_user)
+):
+    """Extra minutes a pickup would add to a trip, as book_trip will compute it"""
+    trip = await find_trip(trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    
+    pickup_location = Location(address="", coordinates={"lat": lat, "lng": lng})
+    return await check_rider_compatibility(trip, pickup_location)
+
 @app.get("/api/trips/{trip_id}")
-async def get_trip_details(trip_id: str, current_user: dict = Depends(get_current_user)):
-    trip = trips_collection.find_one({"id": trip_id})
+async def get_trip_details(
+    trip_id: str,
+    zoom: Optional[float] = Query(None, ge=0, le=22),
+    current_user: dict = Depends(get_current_user)
+):
+    trip = await find_trip(trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
     # Get bookings for this trip
-    bookings = list(bookings_collection.find({"trip_id": trip_id, "status": "confirmed"}))
+    bookings = await bookings_collection.find({"trip_id": trip_id, "status": "confirmed"}).to_list(length=None)
+    users = await get_users_by_ids([booking["user_id"] for booking in bookings])
     booking_details = []
     
     for booking in bookings:
-        user = users_collection.find_one({"id": booking["user_id"]})
+        user = users.get(booking["user_id"])
         booking_info = {
             "id": booking["id"],
             "user_name": user["name"] if user else "Unknown",
@@ -1548,24 +2631,8 @@ async def get_trip_details(trip_id: str, current_user: dict = Depends(get_curren
         
         booking_details.append(booking_info)
     
-    # Handle both old string format and new Location format
-    try:
-        if isinstance(trip["origin"], str):
-            origin = Location(address=trip["origin"], coordinates={"lat": 0, "lng": 0})
-        else:
-            origin = Location(**trip["origin"])
-    except Exception as e:
-        print(f"Error parsing origin: {e}")
-        origin = Location(address=str(trip["origin"]), coordinates={"lat": 0, "lng": 0})
-    
-    try:
-        if isinstance(trip["destination"], str):
-            destination = Location(address=trip["destination"], coordinates={"lat": 0, "lng": 0})
-        else:
-            destination = Location(**trip["destination"])
-    except Exception as e:
-        print(f"Error parsing destination: {e}")
-        destination = Location(address=str(trip["destination"]), coordinates={"lat": 0, "lng": 0})
+    origin = decode_location(trip["origin"])
+    destination = decode_location(trip["destination"])
     
     trip_data = {
         "id": trip["id"],
@@ -1574,7 +2641,7 @@ async def get_trip_details(trip_id: str, current_user: dict = Depends(get_curren
         "origin": origin,
         "destination": destination,
         "departure_time": trip["departure_time"],
-        "available_seats": trip["available_seats"] - len(bookings),
+        "available_seats": trip.get("seats_remaining", trip["available_seats"] - len(bookings)),
         "max_riders": trip["max_riders"],
         "price_per_person": trip["price_per_person"],
         "notes": trip.get("notes", ""),
@@ -1582,7 +2649,7 @@ async def get_trip_details(trip_id: str, current_user: dict = Depends(get_curren
         "created_at": trip["created_at"],
         "distance_km": trip.get("distance_km", 0),
         "duration_minutes": trip.get("duration_minutes", 0),
-        "route_polyline": trip.get("route_polyline", ""),
+        "route_polyline": route_polyline_for_zoom(trip.get("route_polyline"), zoom),
         "bookings": booking_details,
         "is_creator": trip["creator_id"] == current_user["id"]
     }
@@ -1591,19 +2658,15 @@ async def get_trip_details(trip_id: str, current_user: dict = Depends(get_curren
 
 @app.post("/api/trips/{trip_id}/book")
 async def book_trip(trip_id: str, booking_data: BookingCreate, current_user: dict = Depends(get_current_user)):
-    # Check both taxi trips and personal car trips
-    trip = trips_collection.find_one({"id": trip_id})
+    trip = await find_trip(trip_id)
     if not trip:
-        # Check personal car trips collection
-        trip = personal_car_trips_collection.find_one({"id": trip_id})
-        if not trip:
-            raise HTTPException(status_code=404, detail="Trip not found")
+        raise HTTPException(status_code=404, detail="Trip not found")
     
     if trip["creator_id"] == current_user["id"]:
         raise HTTPException(status_code=400, detail="Cannot book your own trip")
     
     # Check if user already booked this trip
-    existing_booking = bookings_collection.find_one({
+    existing_booking = await bookings_collection.find_one({
         "trip_id": trip_id,
         "user_id": current_user["id"],
         "status": "confirmed"
@@ -1612,129 +2675,124 @@ async def book_trip(trip_id: str, booking_data: BookingCreate, current_user: dic
     if existing_booking:
         raise HTTPException(status_code=400, detail="You have already booked this trip")
     
-    # Check available seats
-    current_bookings = bookings_collection.count_documents({
-        "trip_id": trip_id,
-        "status": "confirmed"
-    })
-    
-    if current_bookings >= trip["available_seats"]:
+    # Reserve a seat atomically; the conditional update fails once the trip is full
+    if not await reserve_trip_seat(trip_id):
         raise HTTPException(status_code=400, detail="No available seats")
     
-    # Determine trip type and validate payment method
-    trip_type = trip.get("trip_type", "taxi")  # Default to taxi for legacy trips
-    trip_cost = trip["price_per_person"]
-    
-    # Validate payment method based on trip type
-    if trip_type == "personal_car":
-        # Personal car trips only accept wallet payments
-        if booking_data.payment_method != "wallet":
-            raise HTTPException(status_code=400, detail="Personal car trips only accept wallet payments")
-        
-        # Check wallet balance and deduct payment
-        wallet = get_or_create_wallet(current_user["id"])
-        if wallet["balance"] < trip_cost:
-            raise HTTPException(status_code=400, detail="Insufficient wallet balance")
-        
-        # Deduct amount from wallet
-        update_wallet_balance(current_user["id"], trip_cost, "payment")
-        
-        # Create payment transaction
-        create_wallet_transaction(
-            user_id=current_user["id"],
-            transaction_type="payment",
-            amount=trip_cost,
-            description=f"Personal car trip booking - {trip['origin']['address']} to {trip['destination']['address']}",
-            status="completed"
-        )
-        
-        # Credit to trip creator's wallet
-        update_wallet_balance(trip["creator_id"], trip_cost, "topup")
-        create_wallet_transaction(
-            user_id=trip["creator_id"],
-            transaction_type="topup",
-            amount=trip_cost,
-            description=f"Personal car trip payment received - {trip['origin']['address']} to {trip['destination']['address']}",
-            status="completed"
-        )
-        
-    elif trip_type == "taxi":
-        # Taxi trips accept cash, card, or wallet payments
-        if booking_data.payment_method not in ["cash", "card", "wallet"]:
-            raise HTTPException(status_code=400, detail="Invalid payment method. Taxi trips accept: cash, card, or wallet")
+    try:
+        # Determine trip type and validate payment method
+        trip_type = trip.get("trip_type", "taxi")  # Default to taxi for legacy trips
+        trip_cost = trip["price_per_person"]
         
-        if booking_data.payment_method == "wallet":
+        # Validate payment method based on trip type
+        if trip_type == "personal_car":
+            # Personal car trips only accept wallet payments
+            if booking_data.payment_method != "wallet":
+                raise HTTPException(status_code=400, detail="Personal car trips only accept wallet payments")
+            
             # Check wallet balance and deduct payment
-            wallet = get_or_create_wallet(current_user["id"])
+            wallet = await get_or_create_wallet(current_user["id"])
             if wallet["balance"] < trip_cost:
                 raise HTTPException(status_code=400, detail="Insufficient wallet balance")
             
             # Deduct amount from wallet
-            update_wallet_balance(current_user["id"], trip_cost, "payment")
+            await update_wallet_balance(current_user["id"], trip_cost, "payment")
             
             # Create payment transaction
-            create_wallet_transaction(
+            await create_wallet_transaction(
                 user_id=current_user["id"],
                 transaction_type="payment",
                 amount=trip_cost,
-                description=f"Taxi trip booking - {trip['origin']['address']} to {trip['destination']['address']}",
+                description=f"Personal car trip booking - {trip['origin']['address']} to {trip['destination']['address']}",
                 status="completed"
             )
             
             # Credit to trip creator's wallet
-            update_wallet_balance(trip["creator_id"], trip_cost, "topup")
-            create_wallet_transaction(
+            await update_wallet_balance(trip["creator_id"], trip_cost, "topup")
+            await create_wallet_transaction(
                 user_id=trip["creator_id"],
                 transaction_type="topup",
                 amount=trip_cost,
-                description=f"Taxi trip payment received - {trip['origin']['address']} to {trip['destination']['address']}",
+                description=f"Personal car trip payment received - {trip['origin']['address']} to {trip['destination']['address']}",
                 status="completed"
             )
-        # For cash and card payments, no immediate wallet transaction is needed
-        # The transaction will be handled outside the app (cash on ride, card payment through taxi terminal)
-    
-    # Calculate additional time for rider pickup
-    additional_time = 0
-    pickup_location = None
-    pickup_bus_stop = None
-    
-    if booking_data.pickup_location:
-        pickup_location = booking_data.pickup_location
-        try:
-            origin_location = Location(**trip["origin"])
-            compatibility = check_rider_compatibility(
-                origin_location, 
-                Location(**trip["destination"]), 
-                pickup_location
-            )
-            additional_time = compatibility.get("additional_time_minutes", 0)
-        except Exception as e:
-            print(f"Error calculating pickup time: {e}")
-    
-    if booking_data.pickup_bus_stop_id:
-        bus_stop_data = bus_stops_collection.find_one({"id": booking_data.pickup_bus_stop_id})
-        if bus_stop_data:
-            pickup_bus_stop = BusStop(**bus_stop_data)
-    
-    # Create booking
-    booking_id = str(uuid.uuid4())
-    booking = {
-        "id": booking_id,
-        "trip_id": trip_id,
-        "user_id": current_user["id"],
-        "user_name": current_user["name"],
-        "booking_time": datetime.utcnow(),
-        "pickup_location": pickup_location.dict() if pickup_location else None,
-        "pickup_bus_stop": pickup_bus_stop.dict() if pickup_bus_stop else None,
-        "home_address": booking_data.home_address.dict() if booking_data.home_address else None,
-        "additional_time_minutes": additional_time,
-        "status": "confirmed",
-        "payment_method": booking_data.payment_method,
-        "amount_paid": trip_cost,
-        "trip_type": trip_type
-    }
-    
-    bookings_collection.insert_one(booking)
+            
+        elif trip_type == "taxi":
+            # Taxi trips accept cash, card, or wallet payments
+            if booking_data.payment_method not in ["cash", "card", "wallet"]:
+                raise HTTPException(status_code=400, detail="Invalid payment method. Taxi trips accept: cash, card, or wallet")
+            
+            if booking_data.payment_method == "wallet":
+                # Check wallet balance and deduct payment
+                wallet = await get_or_create_wallet(current_user["id"])
+                if wallet["balance"] < trip_cost:
+                    raise HTTPException(status_code=400, detail="Insufficient wallet balance")
+                
+                # Deduct amount from wallet
+                await update_wallet_balance(current_user["id"], trip_cost, "payment")
+                
+                # Create payment transaction
+                await create_wallet_transaction(
+                    user_id=current_user["id"],
+                    transaction_type="payment",
+                    amount=trip_cost,
+                    description=f"Taxi trip booking - {trip['origin']['address']} to {trip['destination']['address']}",
+                    status="completed"
+                )
+                
+                # Credit to trip creator's wallet
+                await update_wallet_balance(trip["creator_id"], trip_cost, "topup")
+                await create_wallet_transaction(
+                    user_id=trip["creator_id"],
+                    transaction_type="topup",
+                    amount=trip_cost,
+                    description=f"Taxi trip payment received - {trip['origin']['address']} to {trip['destination']['address']}",
+                    status="completed"
+                )
+            # For cash and card payments, no immediate wallet transaction is needed
+            # The transaction will be handled outside the app (cash on ride, card payment through taxi terminal)
+        
+        # Calculate additional time for rider pickup
+        additional_time = 0
+        pickup_location = None
+        pickup_bus_stop = None
+        
+        if booking_data.pickup_location:
+            pickup_location = booking_data.pickup_location
+            try:
+                compatibility = await check_rider_compatibility(trip, pickup_location)
+                additional_time = compatibility.get("additional_time_minutes", 0)
+            except Exception as e:
+                print(f"Error calculating pickup time: {e}")
+        
+        if booking_data.pickup_bus_stop_id:
+            bus_stop_data = await bus_stops_collection.find_one({"id": booking_data.pickup_bus_stop_id})
+            if bus_stop_data:
+                pickup_bus_stop = BusStop(**bus_stop_data)
+        
+        # Create booking
+        booking_id = str(uuid.uuid4())
+        booking = {
+            "id": booking_id,
+            "trip_id": trip_id,
+            "user_id": current_user["id"],
+            "user_name": current_user["name"],
+            "booking_time": datetime.utcnow(),
+            "pickup_location": pickup_location.dict() if pickup_location else None,
+            "pickup_bus_stop": pickup_bus_stop.dict() if pickup_bus_stop else None,
+            "home_address": booking_data.home_address.dict() if booking_data.home_address else None,
+            "additional_time_minutes": additional_time,
+            "status": "confirmed",
+            "payment_method": booking_data.payment_method,
+            "amount_paid": trip_cost,
+            "trip_type": trip_type
+        }
+        
+        await bookings_collection.insert_one(booking)
+    except Exception:
+        # Give the seat back if payment or booking creation failed
+        await release_trip_seat(trip_id)
+        raise
     
     # Send real-time notification to trip creator
     await manager.send_personal_message(
@@ -1757,52 +2815,41 @@ async def book_trip(trip_id: str, booking_data: BookingCreate, current_user: dic
 
 @app.get("/api/user/trips")
 async def get_user_trips(current_user: dict = Depends(get_current_user)):
-    # Get taxi trips created by user
-    created_taxi_trips = list(trips_collection.find({"creator_id": current_user["id"]}))
-    
-    # Get personal car trips created by user
-    created_personal_trips = list(personal_car_trips_collection.find({"creator_id": current_user["id"]}))
+    # Get trips created by user (taxi and personal car)
+    created_trips = await trips_collection.find(
+        {"creator_id": current_user["id"]}, TRIP_SUMMARY_PROJECTION
+    ).to_list(length=None)
     
-    # Get trips booked by user (taxi trips only)
-    user_bookings = list(bookings_collection.find({"user_id": current_user["id"], "status": "confirmed"}))
+    # Get trips booked by user
+    user_bookings = await bookings_collection.find(
+        {"user_id": current_user["id"], "status": "confirmed"}, {"_id": 0, "trip_id": 1}
+    ).to_list(length=None)
     booked_trip_ids = [booking["trip_id"] for booking in user_bookings]
-    booked_trips = list(trips_collection.find({"id": {"$in": booked_trip_ids}}))
     
     # Get personal car trips user has joined
-    user_join_requests = list(join_requests_collection.find({"requester_id": current_user["id"], "status": "approved"}))
+    user_join_requests = await join_requests_collection.find(
+        {"requester_id": current_user["id"], "status": "approved"}, {"_id": 0, "trip_id": 1}
+    ).to_list(length=None)
     joined_trip_ids = [request["trip_id"] for request in user_join_requests]
-    joined_personal_trips = list(personal_car_trips_collection.find({"id": {"$in": joined_trip_ids}}))
     
-    def format_trip(trip, trip_type, category):
-        # Handle both old string format and new Location format
-        try:
-            if isinstance(trip["origin"], str):
-                origin = Location(address=trip["origin"], coordinates={"lat": 0, "lng": 0})
-            else:
-                origin = Location(**trip["origin"])
-        except Exception:
-            origin = Location(address=str(trip["origin"]), coordinates={"lat": 0, "lng": 0})
+    booked_trips = await trips_collection.find(
+        {"id": {"$in": list(set(booked_trip_ids + joined_trip_ids))}}, TRIP_SUMMARY_PROJECTION
+    ).to_list(length=None)
+    
+    def format_trip(trip, category):
+        trip_type = "personal_car" if trip.get("trip_type") == "personal_car" else "taxi"
         
-        try:
-            if isinstance(trip["destination"], str):
-                destination = Location(address=trip["destination"], coordinates={"lat": 0, "lng": 0})
-            else:
-                destination = Location(**trip["destination"])
-        except Exception:
-            destination = Location(address=str(trip["destination"]), coordinates={"lat": 0, "lng": 0})
+        origin = decode_location(trip["origin"])
+        destination = decode_location(trip["destination"])
         
-        # Get current bookings/requests
-        if trip_type == "taxi":
-            current_bookings = bookings_collection.count_documents({"trip_id": trip["id"], "status": "confirmed"})
-        else:
-            current_bookings = join_requests_collection.count_documents({"trip_id": trip["id"], "status": "approved"})
+        current_bookings = trip.get("booked_count", 0)
         
         formatted = {
             "id": trip["id"],
             "origin": origin,
             "destination": destination,
             "departure_time": trip["departure_time"],
-            "available_seats": trip["available_seats"] - current_bookings,
+            "available_seats": trip.get("seats_remaining", trip["available_seats"] - current_bookings),
             "price_per_person": trip["price_per_person"],
             "status": trip["status"],
             "distance_km": trip.get("distance_km", 0),
@@ -1828,19 +2875,8 @@ async def get_user_trips(current_user: dict = Depends(get_current_user)):
         
         return formatted
     
-    created_list = []
-    for trip in created_taxi_trips:
-        created_list.append(format_trip(trip, "taxi", "created"))
-    
-    for trip in created_personal_trips:
-        created_list.append(format_trip(trip, "personal_car", "created"))
-    
-    booked_list = []
-    for trip in booked_trips:
-        booked_list.append(format_trip(trip, "taxi", "booked"))
-    
-    for trip in joined_personal_trips:
-        booked_list.append(format_trip(trip, "personal_car", "booked"))
+    created_list = [format_trip(trip, "created") for trip in created_trips]
+    booked_list = [format_trip(trip, "booked") for trip in booked_trips]
     
     # Sort by departure time
     created_list.sort(key=lambda x: x["departure_time"])
@@ -1854,68 +2890,40 @@ async def get_user_trips(current_user: dict = Depends(get_current_user)):
 @app.get("/api/user/trips")
 async def get_user_trips(current_user: dict = Depends(get_current_user)):
     # Get trips created by user
-    created_trips = list(trips_collection.find({"creator_id": current_user["id"]}))
+    created_trips = await trips_collection.find({"creator_id": current_user["id"]}).to_list(length=None)
     
     # Get trips booked by user
-    user_bookings = list(bookings_collection.find({"user_id": current_user["id"], "status": "confirmed"}))
+    user_bookings = await bookings_collection.find({"user_id": current_user["id"], "status": "confirmed"}).to_list(length=None)
     booked_trip_ids = [booking["trip_id"] for booking in user_bookings]
-    booked_trips = list(trips_collection.find({"id": {"$in": booked_trip_ids}}))
+    booked_trips = await trips_collection.find({"id": {"$in": booked_trip_ids}}).to_list(length=None)
     
     created_list = []
     for trip in created_trips:
-        bookings = list(bookings_collection.find({"trip_id": trip["id"], "status": "confirmed"}))
+        booked_count = trip.get("booked_count", 0)
         
-        # Handle both old string format and new Location format
-        try:
-            if isinstance(trip["origin"], str):
-                origin = Location(address=trip["origin"], coordinates={"lat": 0, "lng": 0})
-            else:
-                origin = Location(**trip["origin"])
-        except Exception:
-            origin = Location(address=str(trip["origin"]), coordinates={"lat": 0, "lng": 0})
-        
-        try:
-            if isinstance(trip["destination"], str):
-                destination = Location(address=trip["destination"], coordinates={"lat": 0, "lng": 0})
-            else:
-                destination = Location(**trip["destination"])
-        except Exception:
-            destination = Location(address=str(trip["destination"]), coordinates={"lat": 0, "lng": 0})
+        origin = decode_location(trip["origin"])
+        destination = decode_location(trip["destination"])
         
         created_list.append({
             "id": trip["id"],
             "origin": origin,
             "destination": destination,
             "departure_time": trip["departure_time"],
-            "available_seats": trip["available_seats"] - len(bookings),
+            "available_seats": trip.get("seats_remaining", trip["available_seats"] - booked_count),
             "price_per_person": trip["price_per_person"],
             "status": trip["status"],
             "distance_km": trip.get("distance_km", 0),
             "duration_minutes": trip.get("duration_minutes", 0),
-            "bookings": len(bookings),
+            "bookings": booked_count,
             "type": "created"
         })
     
     booked_list = []
     for trip in booked_trips:
-        bookings = list(bookings_collection.find({"trip_id": trip["id"], "status": "confirmed"}))
-        
-        # Handle both old string format and new Location format
-        try:
-            if isinstance(trip["origin"], str):
-                origin = Location(address=trip["origin"], coordinates={"lat": 0, "lng": 0})
-            else:
-                origin = Location(**trip["origin"])
-        except Exception:
-            origin = Location(address=str(trip["origin"]), coordinates={"lat": 0, "lng": 0})
+        booked_count = trip.get("booked_count", 0)
         
-        try:
-            if isinstance(trip["destination"], str):
-                destination = Location(address=trip["destination"], coordinates={"lat": 0, "lng": 0})
-            else:
-                destination = Location(**trip["destination"])
-        except Exception:
-            destination = Location(address=str(trip["destination"]), coordinates={"lat": 0, "lng": 0})
+        origin = decode_location(trip["origin"])
+        destination = decode_location(trip["destination"])
         
         booked_list.append({
             "id": trip["id"],
@@ -1927,7 +2935,7 @@ async def get_user_trips(current_user: dict = Depends(get_current_user)):
             "status": trip["status"],
             "distance_km": trip.get("distance_km", 0),
             "duration_minutes": trip.get("duration_minutes", 0),
-            "bookings": len(bookings),
+            "bookings": booked_count,
             "type": "booked"
         })
     
@@ -1938,18 +2946,21 @@ async def get_user_trips(current_user: dict = Depends(get_current_user)):
 
 @app.delete("/api/trips/{trip_id}")
 async def cancel_trip(trip_id: str, current_user: dict = Depends(get_current_user)):
-    trip = trips_collection.find_one({"id": trip_id})
+    trip = await find_trip(trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
     if trip["creator_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to cancel this trip")
     
-    # Update trip status
-    trips_collection.update_one({"id": trip_id}, {"$set": {"status": "cancelled"}})
+    # Update trip status; zeroing seats_remaining also blocks any in-flight booking
+    await trips_collection.update_one(
+        {"id": trip_id},
+        {"$set": {"status": "cancelled", "booked_count": 0, "seats_remaining": 0}}
+    )
     
     # Update all bookings for this trip
-    bookings_collection.update_many(
+    await bookings_collection.update_many(
         {"trip_id": trip_id},
         {"$set": {"status": "cancelled"}}
     )
@@ -1960,63 +2971,171 @@ async def cancel_trip(trip_id: str, current_user: dict = Depends(get_current_use
 @app.post("/api/maps/geocode")
 async def geocode_location(request: LocationRequest):
     """Convert address to coordinates"""
-    if not gmaps:
+    global geocode_seed_hits
+    
+    cache_key = normalize_address(request.address)
+    if cache_key in geocode_seed:
+        geocode_seed_hits += 1
+        return geocode_seed[cache_key]
+    
+    cached_location = await geocode_cache.get(cache_key) if cache_key else MISSING
+    if cached_location is not MISSING:
+        if cached_location is None:
+            raise HTTPException(status_code=404, detail="Address not found")
+        return cached_location
+    
+    if not maps_client:
         raise HTTPException(status_code=500, detail="Maps service not available")
     
     try:
-        result = gmaps.geocode(request.address)
-        if result:
-            location = result[0]
-            return {
-                "address": location["formatted_address"],
-                "coordinates": location["geometry"]["location"],
-                "place_id": location["place_id"]
-            }
-        else:
-            raise HTTPException(status_code=404, detail="Address not found")
+        result = await maps_client.geocode(request.address)
+    except MapsError as e:
+        if e.status in ("CIRCUIT_OPEN", "LATENCY_BUDGET_EXCEEDED"):
+            raise HTTPException(status_code=503, detail="Geocoding temporarily unavailable")
+        raise HTTPException(status_code=500, detail=f"Geocoding failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Geocoding failed: {str(e)}")
-
-@app.post("/api/maps/distance-matrix")
-async def calculate_distances(request: DistanceRequest):
-    """Calculate distances between multiple points"""
-    if not gmaps:
-        raise HTTPException(status_code=500, detail="Maps service not available")
     
-    try:
-        result = gmaps.distance_matrix(
-            origins=request.origins,
-            destinations=request.destinations,
+    if not result:
+        if cache_key:
+            await geocode_cache.set(cache_key, None, ttl=GEOCODE_NEGATIVE_TTL_SECONDS)
+        raise HTTPException(status_code=404, detail="Address not found")
+    
+    location = result[0]
+    geocoded = {
+        "address": location["formatted_address"],
+        "coordinates": location["geometry"]["location"],
+        "place_id": location["place_id"]
+    }
+    if cache_key:
+        await geocode_cache.set(cache_key, geocoded)
+    return geocoded
+
+def matrix_tiles(origin_count: int, destination_count: int) -> List[tuple]:
+    """Row-major (origin range, destination range) tiles within the per-request limits"""
+    columns = min(destination_count, MATRIX_MAX_SIDE)
+    rows = min(origin_count, MATRIX_MAX_SIDE, MATRIX_MAX_ELEMENTS // columns)
+    return [
+        (range(row, min(row + rows, origin_count)), range(column, min(column + columns, destination_count)))
+        for row in range(0, origin_count, rows)
+        for column in range(0, destination_count, columns)
+    ]
+
+async def fetch_matrix_tile(origins: List[str], destinations: List[str], tile: tuple) -> List[dict]:
+    """Routable elements of one tile, fetching only the pairs not already cached"""
+    origin_range, destination_range = tile
+    keys = {(i, j): matrix_cache_key(origins[i], destinations[j]) for i in origin_range for j in destination_range}
+    cached_elements = await matrix_cache.get_many(list(keys.values()))
+    elements = {pair: cached_elements[key] for pair, key in keys.items() if key in cached_elements}
+    
+    # Origins missing the same destinations form one rectangle, so only uncached
+    # pairs are requested: with A-X and B-Y cached, A-Y and B-X go as two requests
+    rectangles = {}
+    for i in origin_range:
+        missing = tuple(j for j in destination_range if (i, j) not in elements)
+        if missing:
+            rectangles.setdefault(missing, []).append(i)
+    
+    routed, unroutable = {}, {}
+    for missing_destinations, missing_origins in rectangles.items():
+        await matrix_rate_limiter.acquire(len(missing_origins) * len(missing_destinations))
+        result = await maps_client.distance_matrix(
+            origins=[origins[i] for i in missing_origins],
+            destinations=[destinations[j] for j in missing_destinations],
             mode="driving",
             units="metric"
         )
-        
-        distances = []
-        for i, origin in enumerate(result["origin_addresses"]):
-            for j, destination in enumerate(result["destination_addresses"]):
-                element = result["rows"][i]["elements"][j]
+        for row, i in enumerate(missing_origins):
+            for column, j in enumerate(missing_destinations):
+                element = result["rows"][row]["elements"][column]
                 if element["status"] == "OK":
-                    distances.append({
-                        "origin": origin,
-                        "destination": destination,
+                    entry = {
+                        "origin": result["origin_addresses"][row],
+                        "destination": result["destination_addresses"][column],
                         "distance": element["distance"]["text"],
                         "distance_value": element["distance"]["value"],
                         "duration": element["duration"]["text"],
                         "duration_value": element["duration"]["value"]
-                    })
+                    }
+                    routed[keys[(i, j)]] = entry
+                else:
+                    entry = None
+                    unroutable[keys[(i, j)]] = None
+                elements[(i, j)] = entry
+    await matrix_cache.set_many(routed)
+    await matrix_cache.set_many(unroutable, ttl=MATRIX_NEGATIVE_TTL_SECONDS)
+    
+    return [
+        dict(elements[(i, j)], origin_index=i, destination_index=j)
+        for i in origin_range for j in destination_range
+        if elements[(i, j)] is not None
+    ]
+
+async def iter_matrix_tiles(origins: List[str], destinations: List[str]):
+    """(tile index, elements or exception) in tile order, with a bounded window of tiles in flight"""
+    tiles = iter(enumerate(matrix_tiles(len(origins), len(destinations))))
+    in_flight = deque()
+    
+    def schedule_next():
+        for index, tile in tiles:
+            in_flight.append((index, asyncio.ensure_future(fetch_matrix_tile(origins, destinations, tile))))
+            return
+    
+    try:
+        for _ in range(MATRIX_TILE_CONCURRENCY):
+            schedule_next()
+        while in_flight:
+            index, task = in_flight.popleft()
+            schedule_next()
+            try:
+                yield index, await task
+            except Exception as e:
+                yield index, e
+    finally:
+        # Client went away or a caller stopped early: drop the remaining tiles
+        for _, task in in_flight:
+            task.cancel()
+
+@app.post("/api/maps/distance-matrix")
+async def calculate_distances(request: DistanceRequest, http_request: Request):
+    """Calculate distances between multiple points; streams NDJSON when the client accepts it"""
+    if not maps_client:
+        raise HTTPException(status_code=500, detail="Maps service not available")
+    
+    if not request.origins or not request.destinations:
+        return {"distances": []}
+    if len(request.origins) * len(request.destinations) > MATRIX_MAX_REQUEST_ELEMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MATRIX_MAX_REQUEST_ELEMENTS} origin-destination pairs per request"
+        )
+    
+    if "application/x-ndjson" in http_request.headers.get("accept", ""):
+        async def stream_distances():
+            async for index, elements in iter_matrix_tiles(request.origins, request.destinations):
+                if isinstance(elements, Exception):
+                    yield json.dumps({"tile": index, "error": f"Distance calculation failed: {str(elements)}"}) + "\n"
+                    continue
+                for element in elements:
+                    yield json.dumps(element) + "\n"
         
-        return {"distances": distances}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Distance calculation failed: {str(e)}")
+        return StreamingResponse(stream_distances(), media_type="application/x-ndjson")
+    
+    distances = []
+    async for _, elements in iter_matrix_tiles(request.origins, request.destinations):
+        if isinstance(elements, Exception):
+            raise HTTPException(status_code=500, detail=f"Distance calculation failed: {str(elements)}")
+        distances.extend(elements)
+    return {"distances": distances}
 
 @app.post("/api/maps/directions")
 async def get_directions(request: DirectionsRequest):
     """Get directions between two points"""
-    if not gmaps:
+    if not maps_client:
         raise HTTPException(status_code=500, detail="Maps service not available")
     
     try:
-        result = gmaps.directions(
+        result = await maps_client.directions(
             origin=request.origin,
             destination=request.destination,
             waypoints=request.waypoints,
@@ -2047,17 +3166,25 @@ async def get_directions(request: DirectionsRequest):
         raise HTTPException(status_code=500, detail=f"Directions failed: {str(e)}")
 
 @app.post("/api/maps/rider-matching")
-async def find_compatible_riders(request: RiderMatchRequest):
+async def match_rider_to_route(request: RiderMatchRequest):
     """Find riders within acceptable detour distance"""
-    if not gmaps:
+    if not maps_client:
         raise HTTPException(status_code=500, detail="Maps service not available")
     
     try:
-        # Calculate original trip distance and duration
-        original_directions = gmaps.directions(
-            origin=request.trip_origin,
-            destination=request.trip_destination,
-            mode="driving"
+        # Original and detour routes are independent, so request them concurrently
+        original_directions, detour_directions = await asyncio.gather(
+            maps_client.directions(
+                origin=request.trip_origin,
+                destination=request.trip_destination,
+                mode="driving"
+            ),
+            maps_client.directions(
+                origin=request.trip_origin,
+                destination=request.trip_destination,
+                waypoints=[request.rider_location],
+                mode="driving"
+            )
         )
         
         if not original_directions:
@@ -2065,14 +3192,6 @@ async def find_compatible_riders(request: RiderMatchRequest):
         
         original_duration = original_directions[0]["legs"][0]["duration"]["value"]
         
-        # Calculate detour route
-        detour_directions = gmaps.directions(
-            origin=request.trip_origin,
-            destination=request.trip_destination,
-            waypoints=[request.rider_location],
-            mode="driving"
-        )
-        
         if not detour_directions:
             return {"compatible": False, "reason": "No detour route found"}
         
@@ -2095,6 +3214,17 @@ async def find_compatible_riders(request: RiderMatchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Rider matching failed: {str(e)}")
 
+async def run_index_check() -> int:
+    await ensure_indexes()
+    violations = await check_index_coverage()
+    for violation in violations:
+        print(f"COLLSCAN on {violation['collection']}: {violation['query']} sort={violation['sort']}")
+    print(f"Index coverage check: {len(INDEX_COVERAGE_QUERIES) - len(violations)}/{len(INDEX_COVERAGE_QUERIES)} queries use an index")
+    return 1 if violations else 0
+
 if __name__ == "__main__":
+    if "--check-indexes" in sys.argv:
+        sys.exit(asyncio.run(run_index_check()))
+    
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
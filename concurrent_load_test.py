@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Concurrent Load Latency Test for Turkish Airlines Car Pooling API
+
+Fires concurrent authenticated requests at the hot read endpoints and reports
+p50/p95/p99 latency. Run it once against a build with the old synchronous
+pymongo data layer and once against the async Motor build to compare.
+
+Usage: python concurrent_load_test.py [base_url] [concurrency] [requests_per_endpoint]
+"""
+
+import os
+import sys
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BASE_URL = os.environ.get("BACKEND_URL", "https://edd6d56b-2a86-4bf5-b3c7-2539850efc2a.preview.emergentagent.com")
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def register_user(base_url):
+    test_id = str(uuid.uuid4())[:8]
+    user_data = {
+        "name": f"Load Test User {test_id}",
+        "email": f"load{test_id}@turkishairlines.com",
+        "phone": f"+90555{test_id}",
+        "employee_id": f"LOAD{test_id}",
+        "department": "IT Testing",
+        "password": "Test123!"
+    }
+    response = requests.post(f"{base_url}/api/auth/register", json=user_data, timeout=30)
+    response.raise_for_status()
+    return response.json()["token"]
+
+def seed_trips(base_url, token, count):
+    headers = {"Authorization": f"Bearer {token}"}
+    departure = datetime.now() + timedelta(days=1)
+    for i in range(count):
+        trip = {
+            "origin": {
+                "address": "Istanbul Airport (IST), Arnavutköy/İstanbul, Turkey",
+                "coordinates": {"lat": 41.2619, "lng": 28.7419}
+            },
+            "destination": {
+                "address": "Taksim Square, Beyoğlu/İstanbul, Turkey",
+                "coordinates": {"lat": 41.0369, "lng": 28.9850}
+            },
+            "departure_time": (departure + timedelta(minutes=i)).isoformat(),
+            "available_seats": 3,
+            "price_per_person": 50.0,
+            "notes": "Load test trip"
+        }
+        requests.post(f"{base_url}/api/trips", json=trip, headers=headers, timeout=30)
+
+def timed_get(url, headers):
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, headers=headers, timeout=60)
+        ok = response.status_code == 200
+    except Exception:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+def run_load(base_url, token, concurrency, requests_per_endpoint):
+    headers = {"Authorization": f"Bearer {token}"}
+    endpoints = ["/api/trips", "/api/user/profile", "/api/wallet", "/api/user/trips", "/api/wallet/transactions"]
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for endpoint in endpoints:
+            url = f"{base_url}{endpoint}"
+            futures = [pool.submit(timed_get, url, headers) for _ in range(requests_per_endpoint)]
+            samples = [f.result() for f in futures]
+            results[endpoint] = samples
+
+    return results
+
+def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else BASE_URL
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    requests_per_endpoint = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    print("🚀 Concurrent Load Latency Test")
+    print(f"Target: {base_url}  Concurrency: {concurrency}  Requests/endpoint: {requests_per_endpoint}")
+    print("=" * 70)
+
+    token = register_user(base_url)
+    seed_trips(base_url, token, 20)
+
+    all_latencies = []
+    for endpoint, samples in run_load(base_url, token, concurrency, requests_per_endpoint).items():
+        latencies = [latency for latency, _ in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        all_latencies.extend(latencies)
+        print(f"{endpoint:28s} p50={percentile(latencies, 50):8.1f}ms  "
+              f"p95={percentile(latencies, 95):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms  errors={errors}")
+
+    print("-" * 70)
+    print(f"{'ALL':28s} p50={percentile(all_latencies, 50):8.1f}ms  "
+          f"p95={percentile(all_latencies, 95):8.1f}ms  p99={percentile(all_latencies, 99):8.1f}ms")
+
+if __name__ == "__main__":
+    main()
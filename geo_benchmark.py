@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Geodesic Kernel Benchmark
+
+Compares N x M haversine and bearing computation one pair at a time with the
+scalar math functions against a single call of the NumPy matrix kernels in
+backend/geo.py, over random points spread across Istanbul. No services needed.
+
+Usage: python geo_benchmark.py [origins] [destinations] [runs]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import geo  # noqa: E402
+
+AREA = {"min_lat": 40.85, "max_lat": 41.25, "min_lng": 28.60, "max_lng": 29.35}
+
+def random_points(rng, count):
+    return [
+        {"lat": rng.uniform(AREA["min_lat"], AREA["max_lat"]), "lng": rng.uniform(AREA["min_lng"], AREA["max_lng"])}
+        for _ in range(count)
+    ]
+
+def scalar_matrix(origins, destinations):
+    return [
+        [(geo.haversine_km(origin, destination), geo.bearing_degrees(origin, destination)) for destination in destinations]
+        for origin in origins
+    ]
+
+def vectorized_matrix(origins, destinations):
+    # Column conversion is part of the cost callers pay
+    origin_columns, destination_columns = geo.coordinate_arrays(origins), geo.coordinate_arrays(destinations)
+    return (geo.haversine_matrix_km(*origin_columns, *destination_columns),
+            geo.bearing_matrix_degrees(*origin_columns, *destination_columns))
+
+def time_runs(function, runs, *args):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def main():
+    origin_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    destination_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rng = random.Random(42)
+    origins, destinations = random_points(rng, origin_count), random_points(rng, destination_count)
+
+    print(f"🚀 Geodesic kernel benchmark: {origin_count} x {destination_count} pairs, {runs} runs")
+    print("=" * 60)
+
+    scalar_latencies = time_runs(scalar_matrix, runs, origins, destinations)
+    vectorized_latencies = time_runs(vectorized_matrix, runs, origins, destinations)
+
+    distances, _ = vectorized_matrix(origins, destinations)
+    worst_error = max(
+        abs(distances[i, j] - distance)
+        for i, row in enumerate(scalar_matrix(origins, destinations))
+        for j, (distance, _) in enumerate(row)
+    )
+
+    print(f"Max distance difference:  {worst_error:.2e} km")
+    print(f"Scalar loop median:       {statistics.median(scalar_latencies):.1f}ms")
+    print(f"Vectorized median:        {statistics.median(vectorized_latencies):.1f}ms")
+    print(f"Speedup (median):         {statistics.median(scalar_latencies) / statistics.median(vectorized_latencies):.1f}x")
+
+if __name__ == "__main__":
+    main()
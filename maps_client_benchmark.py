@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Async Maps Client Benchmark
+
+Fires the same batch of directions requests at a maps endpoint twice: one at a
+time, as the old blocking googlemaps client effectively did on the event loop,
+and concurrently through AsyncMapsClient. Reports wall time and per-request
+latency percentiles for both.
+
+Start the local stand-in first so no API key or network access is needed:
+    python backend/maps_standin.py --latency-ms 150
+
+Usage: python maps_client_benchmark.py [requests] [base_url]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from maps_client import AsyncMapsClient  # noqa: E402
+
+ORIGIN = "41.2619,28.7419"  # Istanbul Airport
+
+def destination(index):
+    # Unique per request so single-flight has nothing to coalesce and every call reaches upstream
+    return f"{41.0 + (index // 100) * 0.001:.4f},{28.95 + (index % 100) * 0.0001:.4f}"
+
+async def timed_directions(client, index, latencies):
+    start = time.perf_counter()
+    await client.directions(origin=ORIGIN, destination=destination(index), mode="driving")
+    latencies.append((time.perf_counter() - start) * 1000)
+
+def report(label, wall_seconds, latencies, upstream_calls, coalesced_calls):
+    latencies = sorted(latencies)
+    print(f"{label}")
+    print(f"  Upstream:     {upstream_calls} calls ({coalesced_calls} coalesced)")
+    print(f"  Wall time:    {wall_seconds:.2f}s")
+    print(f"  Throughput:   {len(latencies) / wall_seconds:.1f} req/s")
+    print(f"  Latency p50:  {statistics.median(latencies):.1f}ms")
+    print(f"  Latency p95:  {latencies[int(len(latencies) * 0.95) - 1]:.1f}ms")
+
+async def main():
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    base_url = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("GOOGLE_MAPS_BASE_URL", "http://127.0.0.1:8090")
+    client = AsyncMapsClient(
+        api_key=os.environ.get("GOOGLE_MAPS_API_KEY", "standin"),
+        base_url=base_url,
+        max_concurrency=int(os.environ.get("MAPS_MAX_CONCURRENCY", "10"))
+    )
+
+    print(f"🚀 Maps client benchmark: {request_count} directions requests against {base_url}")
+    print("=" * 60)
+
+    try:
+        sequential = []
+        start = time.perf_counter()
+        for index in range(request_count):
+            await timed_directions(client, index, sequential)
+        report("Sequential (blocking equivalent)", time.perf_counter() - start, sequential,
+               client.single_flight.calls, client.single_flight.coalesced)
+
+        calls, coalesced = client.single_flight.calls, client.single_flight.coalesced
+        concurrent = []
+        start = time.perf_counter()
+        await asyncio.gather(*(timed_directions(client, index, concurrent) for index in range(request_count)))
+        report("Concurrent (AsyncMapsClient)", time.perf_counter() - start, concurrent,
+               client.single_flight.calls - calls, client.single_flight.coalesced - coalesced)
+
+        print(f"Client stats: {client.stats()}")
+    finally:
+        await client.aclose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Taxi Share Matching Benchmark
+
+Builds open ("searching") taxi booking requests spread over Istanbul and a two
+hour pickup window, as the batch matcher loads them, and times one grouping
+pass over all of them: once with the exhaustive search for small linked sets of
+requests, once greedy only. Reports pass time and how many riders each matched.
+Runs in memory; no database is needed.
+
+Usage: python taxi_matching_benchmark.py [booking_count] [runs]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import ride_matching  # noqa: E402
+
+# Homes and the two airports, where most requests start or end
+AREA = {"min_lat": 40.85, "max_lat": 41.25, "min_lng": 28.60, "max_lng": 29.35}
+AIRPORTS = [{"lat": 41.2619, "lng": 28.7419}, {"lat": 40.8986, "lng": 29.3092}]
+BASE_TIME = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+
+def random_location(rng):
+    return {
+        "address": "Benchmark address",
+        "coordinates": {
+            "lat": rng.uniform(AREA["min_lat"], AREA["max_lat"]),
+            "lng": rng.uniform(AREA["min_lng"], AREA["max_lng"])
+        }
+    }
+
+def airport_location(rng):
+    return {"address": "Benchmark airport", "coordinates": dict(rng.choice(AIRPORTS))}
+
+def make_booking(rng):
+    home, airport = random_location(rng), airport_location(rng)
+    origin, destination = (home, airport) if rng.random() < 0.5 else (airport, home)
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": f"bench-rider-{uuid.uuid4()}",
+        "user_name": "Benchmark Rider",
+        "origin": origin,
+        "destination": destination,
+        "pickup_time": BASE_TIME + timedelta(minutes=rng.randint(0, 120)),
+        "max_waiting_time": 7,
+        "notes": ""
+    }
+
+def time_passes(bookings, runs, **options):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        groups = ride_matching.group_bookings(bookings, **options)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, groups
+
+def report(label, latencies, groups):
+    print(f"{label}")
+    print(f"  Rides:          {len(groups)} ({sum(len(group) == 3 for group in groups)} of three)")
+    print(f"  Riders matched: {sum(len(group) for group in groups)}")
+    print(f"  Pass median:    {statistics.median(latencies):.1f}ms")
+    print(f"  Pass max:       {max(latencies):.1f}ms")
+
+def main():
+    booking_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rng = random.Random(42)
+    bookings = [make_booking(rng) for _ in range(booking_count)]
+
+    print(f"🚀 Taxi share matching benchmark with {booking_count} open requests, {runs} passes")
+    print("=" * 60)
+
+    report("Exhaustive up to the exact limit", *time_passes(bookings, runs))
+    report("Greedy only", *time_passes(bookings, runs, exact_limit=0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Make the backend modules importable by their flat names, as server.py imports them"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
@@ -0,0 +1,49 @@
+"""Vectorized haversine and bearing kernels against the scalar reference"""
+import random
+
+import numpy as np
+import pytest
+
+import geo
+
+AIRPORT = {"lat": 41.2619, "lng": 28.7419}
+TAKSIM = {"lat": 41.0369, "lng": 28.9850}
+
+def random_points(count, seed):
+    rng = random.Random(seed)
+    return [{"lat": rng.uniform(-89.9, 89.9), "lng": rng.uniform(-180, 180)} for _ in range(count)]
+
+def test_scalar_haversine_known_distance():
+    # Istanbul Airport to Taksim is roughly 32 km in a straight line
+    assert geo.haversine_km(AIRPORT, TAKSIM) == pytest.approx(32.3, abs=0.5)
+    assert geo.haversine_km(AIRPORT, AIRPORT) == 0
+
+def test_matrix_matches_scalar_haversine_and_bearing():
+    origins, destinations = random_points(40, 1), random_points(60, 2)
+    distances = geo.haversine_matrix_km(*geo.coordinate_arrays(origins), *geo.coordinate_arrays(destinations))
+    bearings = geo.bearing_matrix_degrees(*geo.coordinate_arrays(origins), *geo.coordinate_arrays(destinations))
+
+    assert distances.shape == bearings.shape == (40, 60)
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            assert distances[i, j] == pytest.approx(geo.haversine_km(origin, destination), abs=1e-9)
+            assert bearings[i, j] == pytest.approx(geo.bearing_degrees(origin, destination), abs=1e-6)
+
+def test_pairwise_matches_scalar_and_broadcasts():
+    origins, destinations = random_points(500, 3), random_points(500, 4)
+    distances = geo.haversine_pairwise_km(*geo.coordinate_arrays(origins), *geo.coordinate_arrays(destinations))
+    expected = [geo.haversine_km(a, b) for a, b in zip(origins, destinations)]
+    np.testing.assert_allclose(distances, expected, rtol=0, atol=1e-9)
+
+    # A single point against an array, as the airport ranking uses it
+    from_airport = geo.haversine_pairwise_km(AIRPORT["lat"], AIRPORT["lng"], *geo.coordinate_arrays(destinations))
+    np.testing.assert_allclose(from_airport, [geo.haversine_km(AIRPORT, b) for b in destinations], rtol=0, atol=1e-9)
+
+def test_antipodal_and_empty_inputs():
+    antipode = {"lat": -AIRPORT["lat"], "lng": AIRPORT["lng"] - 180}
+    distance = geo.haversine_pairwise_km(AIRPORT["lat"], AIRPORT["lng"], antipode["lat"], antipode["lng"])
+    assert not np.isnan(distance)
+    assert float(distance) == pytest.approx(np.pi * geo.EARTH_RADIUS_KM, rel=1e-9)
+
+    lat, lng = geo.coordinate_arrays([])
+    assert geo.haversine_matrix_km(lat, lng, *geo.coordinate_arrays([TAKSIM])).shape == (0, 1)
@@ -0,0 +1,175 @@
+"""Circuit breaker and latency budget behaviour against a slow local maps stand-in"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from maps_client import AsyncMapsClient, MapsError
+from maps_standin import create_app
+from routing import FallbackRoutingProvider, GoogleRoutingProvider, LocalRoutingProvider
+
+AIRPORT = {"lat": 41.2619, "lng": 28.7419}
+TAKSIM = {"lat": 41.0369, "lng": 28.9850}
+
+def make_client(standin, open_seconds=60.0):
+    return AsyncMapsClient(
+        api_key="test",
+        base_url="http://maps-standin",
+        max_retries=0,
+        latency_budgets={"directions": 0.05},
+        breaker_options={"window_size": 10, "min_calls": 3, "open_seconds": open_seconds},
+        transport=httpx.ASGITransport(app=standin)
+    )
+
+def directions(client, index=0):
+    # Distinct destinations so single-flight does not merge the calls
+    return client.directions(origin="41.2619,28.7419", destination=f"41.03{index},28.985")
+
+def test_slow_upstream_exceeds_budget_and_opens_circuit():
+    async def scenario():
+        standin = create_app(latency_ms=500)
+        client = make_client(standin)
+        try:
+            for index in range(3):
+                with pytest.raises(MapsError) as error:
+                    await directions(client, index)
+                assert error.value.status == "LATENCY_BUDGET_EXCEEDED"
+
+            assert client.breakers["directions"].state == "open"
+            requests_before = standin.state.requests
+            with pytest.raises(MapsError) as error:
+                await directions(client, 99)
+            assert error.value.status == "CIRCUIT_OPEN"
+            # Rejected without reaching the upstream
+            assert standin.state.requests == requests_before
+            assert client.stats()["circuits"]["directions"]["rejected"] == 1
+            # Other operations keep their own circuit
+            assert client.breakers["geocode"].state == "closed"
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_open_circuit_falls_back_to_local_estimate():
+    async def scenario():
+        standin = create_app(latency_ms=500)
+        client = make_client(standin)
+        provider = FallbackRoutingProvider(GoogleRoutingProvider(client), LocalRoutingProvider())
+        try:
+            for _ in range(4):
+                route = await provider.route(AIRPORT, TAKSIM)
+                assert route["estimated"] is True
+                assert route["distance_km"] > 0
+            assert client.breakers["directions"].state == "open"
+            assert provider.fallbacks == 4
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_half_open_trial_closes_circuit_once_upstream_recovers():
+    async def scenario():
+        standin = create_app(latency_ms=500)
+        client = make_client(standin, open_seconds=0.1)
+        try:
+            for index in range(3):
+                with pytest.raises(MapsError):
+                    await directions(client, index)
+            assert client.breakers["directions"].state == "open"
+
+            standin.state.latency_ms = 0
+            await asyncio.sleep(0.15)
+            assert client.breakers["directions"].state == "half_open"
+
+            routes = await directions(client, 5)
+            assert routes
+            assert client.breakers["directions"].state == "closed"
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_burst_queued_behind_concurrency_cap_keeps_circuit_closed():
+    async def scenario():
+        standin = create_app(latency_ms=20)
+        # 200 calls through 10 slots would queue for ~0.4 s, well past the 0.1 s budget per request
+        client = AsyncMapsClient(
+            api_key="test",
+            base_url="http://maps-standin",
+            max_concurrency=10,
+            max_retries=0,
+            latency_budgets={"directions": 0.1},
+            breaker_options={"window_size": 10, "min_calls": 3},
+            transport=httpx.ASGITransport(app=standin)
+        )
+        try:
+            results = await asyncio.gather(*(directions(client, index) for index in range(200)), return_exceptions=True)
+            routes = [result for result in results if not isinstance(result, Exception)]
+            errors = [result for result in results if isinstance(result, Exception)]
+            assert routes and all(routes)
+            # The tail of the queue runs out of budget waiting, not the upstream
+            assert errors and all(error.status == "LATENCY_BUDGET_EXCEEDED" for error in errors)
+            assert client.breakers["directions"].state == "closed"
+            assert client.stats()["circuits"]["directions"]["failure_rate"] == 0
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_queue_deeper_than_concurrency_cap_returns_within_budget():
+    async def scenario():
+        standin = create_app(latency_ms=100)
+        client = AsyncMapsClient(
+            api_key="test",
+            base_url="http://maps-standin",
+            max_concurrency=2,
+            max_retries=0,
+            latency_budgets={"directions": 0.15},
+            transport=httpx.ASGITransport(app=standin)
+        )
+
+        async def timed(index):
+            start = time.monotonic()
+            try:
+                await directions(client, index)
+                return time.monotonic() - start, None
+            except MapsError as e:
+                return time.monotonic() - start, e.status
+
+        try:
+            results = await asyncio.gather(*(timed(index) for index in range(10)))
+            assert max(elapsed for elapsed, _ in results) < 0.15 + 0.1
+            statuses = [status for _, status in results]
+            assert None in statuses and "LATENCY_BUDGET_EXCEEDED" in statuses
+            assert set(statuses) == {None, "LATENCY_BUDGET_EXCEEDED"}
+            assert client.breakers["directions"].state == "closed"
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+def test_request_errors_do_not_count_as_failures():
+    async def scenario():
+        breaker = CircuitBreaker("lookup", min_calls=2, is_failure=lambda error: not isinstance(error, KeyError))
+
+        async def bad_request():
+            raise KeyError("not found")
+
+        for _ in range(5):
+            with pytest.raises(KeyError):
+                await breaker.call(bad_request)
+        assert breaker.state == "closed"
+
+        async def unavailable():
+            raise ConnectionError("down")
+
+        # Five request errors and five upstream failures: half the window failed
+        for _ in range(5):
+            with pytest.raises(ConnectionError):
+                await breaker.call(unavailable)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(unavailable)
+
+    asyncio.run(scenario())
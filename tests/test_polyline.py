@@ -0,0 +1,55 @@
+"""Encoded polyline codec and zoom simplification"""
+import math
+import random
+
+import pytest
+
+import polyline
+
+# Reference example from Google's encoded polyline algorithm documentation
+GOOGLE_ENCODED = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+def winding_route(count, seed=1):
+    rng = random.Random(seed)
+    lat, lng, heading = 41.0, 29.0, 0.3
+    points = []
+    for _ in range(count):
+        heading += rng.gauss(0, 0.25)
+        step_m = rng.uniform(10, 80)
+        lat += step_m * math.cos(heading) / 111320
+        lng += step_m * math.sin(heading) / (111320 * math.cos(math.radians(lat)))
+        points.append((round(lat, 5), round(lng, 5)))
+    return points
+
+def test_google_reference_polyline():
+    assert polyline.decode(GOOGLE_ENCODED) == pytest.approx(GOOGLE_POINTS)
+    assert polyline.encode(GOOGLE_POINTS) == GOOGLE_ENCODED
+
+def test_encode_decode_round_trip():
+    points = winding_route(1000)
+    assert polyline.decode(polyline.encode(points)) == pytest.approx(points, abs=1e-9)
+    assert polyline.decode("") == []
+    assert polyline.encode([]) == ""
+
+def test_simplify_for_zoom_keeps_endpoints_and_stays_within_tolerance():
+    points = winding_route(2000)
+    coarse = polyline.simplify_for_zoom(points, 10)
+    fine = polyline.simplify_for_zoom(points, 16)
+
+    assert coarse[0] == points[0] and coarse[-1] == points[-1]
+    assert len(coarse) < len(fine) < len(points)
+    # Every dropped point stays within one pixel of the kept line at that zoom
+    tolerance_m = polyline.zoom_tolerance_m(10, points[0][0])
+    cos_lat = math.cos(math.radians(points[0][0]))
+    project = lambda point: (math.radians(point[1]) * polyline.EARTH_RADIUS_M * cos_lat,
+                             math.radians(point[0]) * polyline.EARTH_RADIUS_M)
+    kept = [points.index(point) for point in coarse]
+    for first, last in zip(kept, kept[1:]):
+        for index in range(first + 1, last):
+            distance = polyline._segment_distance_m(project(points[index]), project(points[first]), project(points[last]))
+            assert distance <= tolerance_m + 1e-6
+
+def test_simplify_leaves_short_lines_alone():
+    assert polyline.simplify_for_zoom([], 12) == []
+    assert polyline.simplify_for_zoom(GOOGLE_POINTS[:2], 12) == GOOGLE_POINTS[:2]
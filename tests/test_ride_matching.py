@@ -0,0 +1,88 @@
+"""Grouping open taxi-share requests into shared rides"""
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import geo
+import ride_matching
+
+PICKUP = datetime(2030, 1, 1, 8, 0)
+AIRPORT = {"lat": 41.2619, "lng": 28.7419}
+KM_PER_DEGREE_LAT = 6371.0 * 3.141592653589793 / 180
+
+def booking(name, km_north, user_id=None, minutes=0):
+    """Request picked up km_north of a fixed point on one meridian, going to the airport"""
+    return {
+        "id": name,
+        "user_id": user_id or f"user-{name}",
+        "user_name": name,
+        "origin": {"address": name, "coordinates": {"lat": 41.0 + km_north / KM_PER_DEGREE_LAT, "lng": 29.0}},
+        "destination": {"address": "Airport", "coordinates": dict(AIRPORT)},
+        "pickup_time": PICKUP + timedelta(minutes=minutes),
+        "max_waiting_time": 7
+    }
+
+def ride_names(groups):
+    return sorted(sorted(booking["id"] for booking in group) for group in groups)
+
+def test_shortest_path_skips_longest_leg():
+    distances = {frozenset("ab"): 1.0, frozenset("bc"): 2.0, frozenset("ac"): 2.5}
+    assert ride_matching.shortest_path_km(("a", "b", "c"), distances) == pytest.approx(3.0)
+    assert ride_matching.shortest_path_km(("a", "c"), distances) == pytest.approx(2.5)
+
+def test_requests_of_the_same_user_are_never_grouped():
+    assert ride_matching.group_bookings([booking("a", 0, "same"), booking("b", 1, "same")]) == []
+    groups = ride_matching.group_bookings([booking("a", 0, "same"), booking("b", 1, "same"), booking("c", 2)])
+    assert ride_names(groups) == [["b", "c"]]
+
+def test_out_of_range_and_late_requests_are_not_grouped():
+    assert ride_matching.group_bookings([booking("a", 0), booking("b", 8)]) == []
+    assert ride_matching.group_bookings([booking("a", 0), booking("b", 1, minutes=10)]) == []
+    assert ride_names(ride_matching.group_bookings([booking("a", 0), booking("b", 1, minutes=5)])) == [["a", "b"]]
+
+def test_three_compatible_riders_share_one_ride():
+    groups = ride_matching.group_bookings([booking("a", 0), booking("b", 1), booking("c", 2)])
+    assert ride_names(groups) == [["a", "b", "c"]]
+
+def test_maximizes_riders_then_minimizes_detour():
+    # Any three of the four fit one ride, but two pairs match everyone; the
+    # pairs chosen are the two close ones
+    bookings = [booking("a", 0), booking("b", 0.5), booking("c", 5), booking("d", 5.5)]
+    assert ride_names(ride_matching.group_bookings(bookings)) == [["a", "b"], ["c", "d"]]
+
+def test_exhaustive_search_beats_greedy_on_small_sets():
+    # b-c-d is the shortest ride of three, but taking it strands a and e,
+    # which are too far apart to ride together
+    bookings = [booking("a", 0), booking("b", 5), booking("c", 6), booking("d", 7.5), booking("e", 12.5)]
+
+    exhaustive = ride_matching.group_bookings(bookings)
+    assert ride_names(exhaustive) == [["a", "b", "c"], ["d", "e"]]
+
+    greedy = ride_matching.group_bookings(bookings, exact_limit=len(bookings) - 1)
+    assert ride_names(greedy) == [["b", "c", "d"]]
+
+def test_riders_in_a_ride_are_ordered_by_pickup_time():
+    groups = ride_matching.group_bookings([booking("a", 0, minutes=5), booking("b", 1)])
+    assert [rider["id"] for rider in groups[0]] == ["b", "a"]
+
+def test_cell_and_bucket_grid_finds_every_compatible_pair():
+    rng = random.Random(7)
+    bookings = []
+    for index in range(400):
+        rider = booking(str(index), rng.uniform(0, 40), minutes=rng.randint(0, 90))
+        rider["origin"]["coordinates"]["lng"] = rng.uniform(28.6, 29.3)
+        rider["destination"]["coordinates"] = {"lat": rng.uniform(40.95, 41.05), "lng": rng.uniform(28.9, 29.0)}
+        bookings.append(rider)
+
+    expected = set()
+    for first, second in itertools.combinations(range(len(bookings)), 2):
+        a, b = bookings[first], bookings[second]
+        if (geo.haversine_km(a["origin"]["coordinates"], b["origin"]["coordinates"]) <= ride_matching.MATCH_RADIUS_KM
+                and geo.haversine_km(a["destination"]["coordinates"], b["destination"]["coordinates"]) <= ride_matching.MATCH_RADIUS_KM
+                and abs((a["pickup_time"] - b["pickup_time"]).total_seconds()) <= 7 * 60):
+            expected.add(frozenset((first, second)))
+
+    assert expected
+    assert set(ride_matching.match_edges(bookings, neighbours=len(bookings))) == expected
@@ -0,0 +1,119 @@
+"""TieredCache local entries against a shared Redis tier"""
+import asyncio
+import time
+
+from cache import MISSING, TieredCache
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, key):
+        self.commands.append(("get", (key,), {}))
+        return self
+
+    def pttl(self, key):
+        self.commands.append(("pttl", (key,), {}))
+        return self
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("set", (key, value), {"ex": ex}))
+        return self
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [await getattr(self.redis, command)(*args, **kwargs) for command, args, kwargs in self.commands]
+
+class FakeRedis:
+    """The slice of redis.asyncio the cache uses, with real expiry"""
+
+    def __init__(self):
+        self.entries = {}
+        self.round_trips = 0  # pipeline executions
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return None
+        return entry[0]
+
+    async def pttl(self, key):
+        if await self.get(key) is None:
+            return -2
+        expires_at = self.entries[key][1]
+        return -1 if expires_at is None else int((expires_at - time.monotonic()) * 1000)
+
+    async def set(self, key, value, ex=None):
+        self.entries[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def delete(self, key):
+        self.entries.pop(key, None)
+
+def local_ttl(cache, key):
+    return cache.local._entries[key][1] - time.monotonic()
+
+def test_redis_hit_keeps_remaining_ttl_locally():
+    async def scenario():
+        redis = FakeRedis()
+        writer = TieredCache("geocode", maxsize=10, ttl=2592000, redis_client=redis)
+        reader = TieredCache("geocode", maxsize=10, ttl=2592000, redis_client=redis)
+
+        # A cached miss written by one worker with a short TTL
+        await writer.set("nowhere", None, ttl=300)
+        assert await reader.get("nowhere") is None
+        assert reader.redis_hits == 1
+        assert 0 < local_ttl(reader, "nowhere") <= 300
+
+        await writer.set("taksim", {"lat": 41.0369, "lng": 28.985})
+        assert await reader.get("taksim") == {"lat": 41.0369, "lng": 28.985}
+        assert local_ttl(reader, "taksim") > 300
+
+    asyncio.run(scenario())
+
+def test_key_without_expiry_uses_namespace_ttl():
+    async def scenario():
+        redis = FakeRedis()
+        await redis.set("route:a|b", "12.5")
+        cache = TieredCache("route", maxsize=10, ttl=60, redis_client=redis)
+        assert await cache.get("a|b") == 12.5
+        assert 0 < local_ttl(cache, "a|b") <= 60
+        assert await cache.get("missing") is MISSING
+
+    asyncio.run(scenario())
+
+def test_get_many_and_set_many_use_one_redis_round_trip_each():
+    async def scenario():
+        redis = FakeRedis()
+        writer = TieredCache("matrix", maxsize=100, ttl=3600, redis_client=redis)
+        reader = TieredCache("matrix", maxsize=100, ttl=3600, redis_client=redis)
+
+        await writer.set_many({f"a|{index}": {"distance_value": index} for index in range(50)})
+        await writer.set_many({"a|nowhere": None}, ttl=300)
+        assert redis.round_trips == 2
+
+        await reader.set("a|0", {"distance_value": 0})  # already local in the reader
+        redis.round_trips = 0
+        keys = [f"a|{index}" for index in range(60)] + ["a|nowhere"]
+        found = await reader.get_many(keys)
+        assert redis.round_trips == 1
+        assert len(found) == 51
+        assert found["a|49"] == {"distance_value": 49} and found["a|nowhere"] is None
+        assert "a|55" not in found
+        assert reader.redis_hits == 50
+        assert 0 < local_ttl(reader, "a|nowhere") <= 300
+
+        # Now all local: no round trip at all
+        assert len(await reader.get_many(keys[:50])) == 50
+        assert redis.round_trips == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+GET /api/trips Listing Benchmark
+
+Seeds 5,000 active trips (half taxi, half personal car) with bookings and
+approved join requests, then calls the get_available_trips handler directly
+and reports how many MongoDB commands one listing page issues and how long it
+takes.
+Requires a reachable MONGO_URL; every seeded document is removed afterwards.
+
+Usage: python trip_listing_benchmark.py [trip_count] [runs]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import monitoring
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+# Listeners must be registered before the server creates its client
+counter = CommandCounter()
+monitoring.register(counter)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import server  # noqa: E402
+
+# getMore batches scale with result size, not with the number of lookups
+QUERY_COMMANDS = {"find", "aggregate", "count"}
+
+def make_trip(run_id, index, trip_type):
+    departure = datetime.utcnow() + timedelta(hours=1, minutes=index)
+    trip = {
+        "id": str(uuid.uuid4()),
+        "trip_type": trip_type,
+        "creator_id": f"bench-creator-{index % 50}",
+        "creator_name": "Benchmark Creator",
+        "origin": {"address": "Istanbul Airport (IST)", "coordinates": {"lat": 41.2619, "lng": 28.7419}},
+        "destination": {"address": "Taksim Square", "coordinates": {"lat": 41.0369, "lng": 28.9850}},
+        "departure_time": departure,
+        "available_seats": 3,
+        "max_riders": 3,
+        "price_per_person": 50.0,
+        "notes": "Benchmark trip",
+        "status": "active",
+        "created_at": datetime.utcnow(),
+        "distance_km": 42.0,
+        "duration_minutes": 45,
+        "route_polyline": "",
+        "booked_count": index % 3,
+        "seats_remaining": 3 - index % 3,
+        "benchmark_run": run_id
+    }
+    if trip_type == "personal_car":
+        trip.update({"car_model": "Fiat Egea", "car_color": "White", "license_plate": "34 TK 000"})
+    return trip
+
+async def seed(run_id, trip_count):
+    taxi_trips = [make_trip(run_id, i, "taxi") for i in range(trip_count // 2)]
+    personal_trips = [make_trip(run_id, i, "personal_car") for i in range(trip_count - trip_count // 2)]
+    bookings = [
+        {"id": str(uuid.uuid4()), "trip_id": trip["id"], "user_id": f"bench-rider-{i}-{n}",
+         "status": "confirmed", "benchmark_run": run_id}
+        for i, trip in enumerate(taxi_trips) for n in range(i % 3)
+    ]
+    join_requests = [
+        {"id": str(uuid.uuid4()), "trip_id": trip["id"], "requester_id": f"bench-rider-{i}-{n}",
+         "status": "approved", "benchmark_run": run_id}
+        for i, trip in enumerate(personal_trips) for n in range(i % 3)
+    ]
+    await server.trips_collection.insert_many(taxi_trips + personal_trips)
+    if bookings:
+        await server.bookings_collection.insert_many(bookings)
+    if join_requests:
+        await server.join_requests_collection.insert_many(join_requests)
+
+async def cleanup(run_id):
+    for collection in (server.trips_collection, server.bookings_collection, server.join_requests_collection):
+        await collection.delete_many({"benchmark_run": run_id})
+
+async def main():
+    trip_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run_id = str(uuid.uuid4())
+    viewer = {"id": "bench-viewer", "name": "Benchmark Viewer"}
+
+    print(f"🚀 GET /api/trips benchmark with {trip_count} seeded trips, {runs} runs")
+    print("=" * 60)
+
+    await server.ensure_indexes()
+    await seed(run_id, trip_count)
+    try:
+        latencies = []
+        query_counts = []
+        for _ in range(runs):
+            counter.commands.clear()
+            start = time.perf_counter()
+            result = await server.get_available_trips(
+                trip_type=None, cursor=None, limit=server.TRIP_LIST_MAX_LIMIT,
+                departure_from=None, departure_to=None,
+                min_lat=None, max_lat=None, min_lng=None, max_lng=None, view="summary",
+                current_user=viewer
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(sum(1 for name in counter.commands if name in QUERY_COMMANDS))
+
+        print(f"Trips returned:        {len(result['trips'])}")
+        print(f"Queries per listing:   {max(query_counts)}")
+        print(f"Latency median:        {statistics.median(latencies):.1f}ms")
+        print(f"Latency max:           {max(latencies):.1f}ms")
+    finally:
+        await cleanup(run_id)
+
+if __name__ == "__main__":
+    asyncio.run(main())